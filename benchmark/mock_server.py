@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_helper import RedisHelper
+
+PAGE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_redisinsight.html")
+
+
+class MockRedisInsightHandler(BaseHTTPRequestHandler):
+    """Phục vụ trang RedisInsight giả lập và các API /api/scan, /api/count, /api/delete trên Redis thật"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _params(self):
+        query = parse_qs(urlparse(self.path).query)
+        return {name: values[0] for name, values in query.items()}
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        params = self._params()
+        redis_helper = self.server.redis_helper
+        if path in ("/", "/browser"):
+            with open(PAGE_FILE, 'rb') as file:
+                self._send(200, file.read(), content_type="text/html")
+        elif path == "/api/scan":
+            cursor, keys = redis_helper.scan_page(int(params.get("cursor", 0)), params.get("match", "*"),
+                                                  int(params.get("count", 500)))
+            self._send(200, {"cursor": cursor, "keys": keys})
+        elif path == "/api/count":
+            count = sum(1 for _ in redis_helper.scan_keys(params.get("match", "*")))
+            self._send(200, {"count": count})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/api/delete":
+            self._send(404, {"error": "not found"})
+            return
+        deleted = self.server.redis_helper.delete_keys_by_pattern(self._params().get("match", "*"))
+        self._send(200, {"deleted": deleted})
+
+
+def start_server(redis_helper, host="127.0.0.1", port=0):
+    """Chạy server trên luồng nền, trả về (server, url của trang)"""
+    server = ThreadingHTTPServer((host, port), MockRedisInsightHandler)
+    server.daemon_threads = True
+    server.redis_helper = redis_helper
+    threading.Thread(target=server.serve_forever, name="mock-redisinsight", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/browser"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trang RedisInsight giả lập trên Redis cục bộ")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server, url = start_server(RedisHelper(url=args.redis_url), port=args.port)
+    print(f"Mock RedisInsight: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
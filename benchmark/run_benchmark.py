@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main as delete_key
+from metrics import metrics
+from redis_helper import RedisHelper
+from mock_server import start_server
+
+CHROME_BINARIES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+
+def seed_redis(redis_helper, topics, keys_per_topic, keep_topics, batch_size=1000):
+    """Nạp dữ liệu mẫu dạng 'offline_recommend/{i}/{topic}', trả về (danh sách topic giữ lại, số key cần xóa)"""
+    redis_helper.client.flushdb()
+    names = [f"topic_{index:05d}" for index in range(topics)]
+    pipe = redis_helper.client.pipeline(transaction=False)
+    pending = 0
+    for name in names:
+        for index in range(keys_per_topic):
+            pipe.set(f"offline_recommend/{index}/{name}", "x")
+            pending += 1
+            if pending >= batch_size:
+                pipe.execute()
+                pending = 0
+    pipe.execute()
+    kept = names[:keep_topics]
+    return kept, (topics - len(kept)) * keys_per_topic
+
+
+def chrome_available():
+    return any(shutil.which(name) for name in CHROME_BINARIES)
+
+
+def run_case(backend, workers, args, redis_helper, page_url):
+    """Chạy main() một lần trong thư mục tạm với dữ liệu vừa nạp, trả về kết quả đo"""
+    started = time.perf_counter()
+    kept, expected_keys = seed_redis(redis_helper, args.topics, args.keys_per_topic, args.keep_topics)
+    seed_seconds = time.perf_counter() - started
+
+    work_dir = tempfile.mkdtemp(prefix="delete_key_bench_")
+    cwd = os.getcwd()
+    try:
+        with open(os.path.join(work_dir, "account.json"), 'w', encoding='utf-8') as file:
+            json.dump({"account": {"url": page_url}}, file)
+        with open(os.path.join(work_dir, "topic.json"), 'w', encoding='utf-8') as file:
+            json.dump(kept, file, ensure_ascii=False)
+
+        argv = ["--backend", backend, "--workers", str(workers), "--metrics-interval", "0"]
+        if backend == "redis":
+            argv += ["--redis-url", args.redis_url]
+        else:
+            argv.append("--headless")
+
+        os.chdir(work_dir)
+        metrics.reset()
+        started = time.perf_counter()
+        delete_key.main(argv)
+        wall_clock = time.perf_counter() - started
+        summary = metrics.summary()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    counters = summary["counters"]
+    remaining = redis_helper.client.dbsize()
+    return {
+        "backend": backend,
+        "workers": workers,
+        "topics": args.topics,
+        "keys_per_topic": args.keys_per_topic,
+        "seed_seconds": round(seed_seconds, 3),
+        "wall_clock_seconds": round(wall_clock, 3),
+        "topics_deleted": counters.get("topics_deleted", 0),
+        "keys_deleted": counters.get("keys_deleted", 0),
+        "expected_keys": expected_keys,
+        "keys_remaining": remaining - len(kept) * args.keys_per_topic,
+        "topics_per_sec": round(counters.get("topics_deleted", 0) / wall_clock, 2),
+        "keys_per_sec": round(counters.get("keys_deleted", 0) / wall_clock, 2),
+        "phases": {phase: stats["total_seconds"] for phase, stats in summary["phases"].items()},
+    }
+
+
+def print_report(results):
+    header = f"{'backend':<9}{'workers':>8}{'wall(s)':>10}{'topics/s':>10}{'keys/s':>12}{'left':>7}  phases(s)"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        phases = ", ".join(f"{phase}={seconds}" for phase, seconds in sorted(result["phases"].items()))
+        print(f"{result['backend']:<9}{result['workers']:>8}{result['wall_clock_seconds']:>10}"
+              f"{result['topics_per_sec']:>10}{result['keys_per_sec']:>12}{result['keys_remaining']:>7}  {phases}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Đo tốc độ xóa key trên Redis cục bộ và trang RedisInsight giả lập")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15",
+                        help="Redis dùng để benchmark (database sẽ bị FLUSHDB mỗi lần chạy)")
+    parser.add_argument("--topics", type=int, default=200, help="Số topic nạp vào Redis")
+    parser.add_argument("--keys-per-topic", type=int, default=50, help="Số key mỗi topic")
+    parser.add_argument("--keep-topics", type=int, default=20, help="Số topic đưa vào topic.json (không bị xóa)")
+    parser.add_argument("--backends", default="redis,selenium", help="Các backend cần đo, cách nhau bởi dấu phẩy")
+    parser.add_argument("--workers", default="1,4", help="Các mức số worker cần đo, cách nhau bởi dấu phẩy")
+    parser.add_argument("--flush", action="store_true",
+                        help="Xác nhận cho phép xóa sạch database đích khi database đó đang có dữ liệu")
+    parser.add_argument("--port", type=int, default=0, help="Cổng của trang giả lập (0 = tự chọn)")
+    parser.add_argument("--output", default="benchmark_results.json", help="File kết quả JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    redis_helper = RedisHelper(url=args.redis_url)
+    redis_helper.ping()
+    if redis_helper.client.dbsize() and not args.flush:
+        print(f"Database {args.redis_url} đang có dữ liệu, thêm --flush nếu chắc chắn muốn xóa sạch để benchmark")
+        return 1
+
+    server, page_url = start_server(redis_helper, port=args.port)
+    results = []
+    try:
+        for backend in filter(None, (name.strip() for name in args.backends.split(","))):
+            if backend == "selenium" and not chrome_available():
+                print("Bỏ qua backend selenium: không tìm thấy Chrome/Chromium")
+                continue
+            for workers in (int(value) for value in args.workers.split(",")):
+                result = run_case(backend, workers, args, redis_helper, page_url)
+                results.append(result)
+                print(f"{backend} x{workers}: {result['wall_clock_seconds']}s, {result['keys_per_sec']} key/s")
+    finally:
+        server.shutdown()
+        redis_helper.client.flushdb()
+        redis_helper.close()
+
+    print_report(results)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
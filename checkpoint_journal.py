@@ -0,0 +1,306 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from logging_setup import get_logger
+
+logger = get_logger("state")
+
+
+def _read_json(file_path, default):
+    """Đọc file JSON cũ, trả về default nếu file không tồn tại hoặc bị hỏng"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        logger.error(f"Lỗi khi đọc file {file_path}: {e}")
+        return default
+
+
+def _write_atomic(file_path, write):
+    """Ghi file qua file tạm rồi os.replace để không bao giờ để lại file ghi dở"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(file_path))
+    try:
+        # mkstemp tạo file quyền 600, giữ lại quyền của file cũ (hoặc 644 nếu chưa có)
+        try:
+            mode = os.stat(file_path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CheckpointJournal:
+    """Nhật ký trạng thái chỉ ghi nối (JSONL) cho topic đã xử lý, đã xóa và số key đã xóa"""
+
+    def __init__(self, file_path="checkpoint.jsonl", fsync_every=50, fsync_interval=1.0):
+        self.file_path = file_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.processed = set()
+        self.processed_at = {}  # thời điểm (epoch) topic được ghi nhận đã xử lý, dùng cho hết hạn theo thời gian
+        self.deleted = set()
+        self.queued = set()  # topic đã đưa vào hàng đợi xóa, còn chờ nếu chưa có trong processed
+        self.cursors = {}  # vị trí quét để tiếp tục sau khi chạy lại (SCAN cursor, vị trí danh sách UI)
+        self.fingerprints = {}  # topic -> {"keys"} ở lần quét gần nhất, cho chế độ incremental
+        self.total_keys_deleted = 0
+        self.is_new = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._load()
+        self._file = open(file_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if self.is_new:
+            return
+        complete = 0  # vị trí (byte) ngay sau dòng đầy đủ cuối cùng (kết thúc bằng \n)
+        tail_valid = True
+        with open(self.file_path, 'rb') as file:
+            for line_number, raw in enumerate(file, 1):
+                if raw.endswith(b"\n"):
+                    complete += len(raw)
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    self._apply(json.loads(line.decode('utf-8')))
+                    tail_valid = True
+                except (ValueError, KeyError, TypeError) as e:
+                    # Dòng cuối có thể bị cắt dở khi tiến trình chết giữa chừng
+                    tail_valid = False
+                    logger.warning(f"Bỏ qua dòng {line_number} hỏng trong {self.file_path}: {e}")
+        self._repair_tail(complete, tail_valid)
+        logger.info(f"Đã nạp {self.file_path}: {len(self.processed)} topic đã xử lý, "
+                     f"{len(self.deleted)} topic đã xóa, {self.total_keys_deleted} key đã xóa")
+
+    def _repair_tail(self, complete, tail_valid):
+        """Dòng cuối thiếu \n: cắt bỏ nếu hỏng, thêm \n nếu hợp lệ, để sự kiện mới không bị ghi nối vào nó"""
+        if os.path.getsize(self.file_path) == complete:
+            return
+        with open(self.file_path, 'rb+') as file:
+            if tail_valid:
+                file.seek(0, os.SEEK_END)
+                file.write(b"\n")
+            else:
+                file.truncate(complete)
+                logger.warning(f"Đã cắt bỏ dòng cuối bị ghi dở trong {self.file_path}")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _apply(self, event):
+        kind = event["e"]
+        if kind == "processed":
+            self.processed.add(event["topic"])
+            # Bản ghi cũ không có "t" được coi là rất cũ (hết hạn ngay khi bật hết hạn theo thời gian)
+            self.processed_at[event["topic"]] = event.get("t", 0)
+        elif kind == "expired":
+            self.processed.discard(event["topic"])
+            self.queued.discard(event["topic"])
+            self.processed_at.pop(event["topic"], None)
+            self.fingerprints.pop(event["topic"], None)
+        elif kind == "fingerprint":
+            # Bản ghi cũ có thêm "samples"/"seen" không dùng tới, chỉ giữ số key
+            self.fingerprints[event["topic"]] = {"keys": int(event["keys"])}
+        elif kind == "deleted":
+            self.deleted.add(event["topic"])
+        elif kind == "keys":
+            self.total_keys_deleted += int(event["n"])
+        elif kind == "queued":
+            self.queued.add(event["topic"])
+        elif kind == "cursor":
+            self.cursors[event["name"]] = event["value"]
+
+    def _append(self, event):
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        # flush vào OS sau mỗi sự kiện, fsync xuống đĩa theo lô
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def record_processed(self, topic):
+        """Ghi nhận topic đã xử lý, trả về False nếu đã có từ trước"""
+        with self._lock:
+            if topic in self.processed:
+                return False
+            now = round(time.time(), 3)
+            self.processed.add(topic)
+            self.processed_at[topic] = now
+            self._append({"e": "processed", "topic": topic, "t": now})
+            return True
+
+    def processed_snapshot(self):
+        """Bản sao tập topic đã xử lý, an toàn khi worker khác đang ghi nhận thêm topic"""
+        with self._lock:
+            return set(self.processed)
+
+    def expire_processed(self, max_age, now=None):
+        """Bỏ khỏi tập đã xử lý các topic cũ hơn max_age giây (kèm fingerprint) để lần chạy này xét lại từ đầu"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = sorted(topic for topic in self.processed if now - self.processed_at.get(topic, 0) > max_age)
+            for topic in expired:
+                self.processed.discard(topic)
+                self.queued.discard(topic)
+                self.processed_at.pop(topic, None)
+                self.fingerprints.pop(topic, None)
+                self._append({"e": "expired", "topic": topic})
+            return expired
+
+    def record_fingerprint(self, topic, keys):
+        """Lưu số key của topic ở lượt quét gần nhất (dùng để phát hiện topic có thêm key)"""
+        with self._lock:
+            fingerprint = {"keys": keys}
+            self.fingerprints[topic] = fingerprint
+            self._append(dict({"e": "fingerprint", "topic": topic}, **fingerprint))
+
+    def record_deleted(self, topic):
+        """Ghi nhận topic đã xóa thành công, trả về False nếu đã có từ trước"""
+        with self._lock:
+            if topic in self.deleted:
+                return False
+            self.deleted.add(topic)
+            self._append({"e": "deleted", "topic": topic})
+            return True
+
+    def record_key_count(self, keys_deleted):
+        """Cộng dồn số key đã xóa, trả về tổng mới"""
+        with self._lock:
+            self.total_keys_deleted += keys_deleted
+            self._append({"e": "keys", "n": keys_deleted})
+            return self.total_keys_deleted
+
+    def record_queued(self, topic):
+        """Ghi nhận topic đã được đưa vào hàng đợi xóa (để xóa tiếp nếu tiến trình chết trước khi xong)"""
+        with self._lock:
+            if topic in self.queued:
+                return False
+            self.queued.add(topic)
+            self._append({"e": "queued", "topic": topic})
+            return True
+
+    def pending_topics(self):
+        """Các topic đã vào hàng đợi nhưng chưa xử lý xong"""
+        with self._lock:
+            return sorted(self.queued - self.processed)
+
+    def record_cursor(self, name, value):
+        """Lưu vị trí quét hiện tại; value rỗng nghĩa là đã quét xong, lần sau bắt đầu lại từ đầu"""
+        with self._lock:
+            if self.cursors.get(name) == value:
+                return
+            self.cursors[name] = value
+            self._append({"e": "cursor", "name": name, "value": value})
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def compact(self):
+        """Viết lại nhật ký chỉ gồm trạng thái hiện tại, thay thế file cũ một cách nguyên tử"""
+        with self._lock:
+            self.flush()
+            self._file.close()
+
+            def write(file):
+                for topic in sorted(self.processed):
+                    event = {"e": "processed", "topic": topic, "t": self.processed_at.get(topic, 0)}
+                    file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                for topic in sorted(self.deleted):
+                    file.write(json.dumps({"e": "deleted", "topic": topic}, ensure_ascii=False) + "\n")
+                if self.total_keys_deleted:
+                    file.write(json.dumps({"e": "keys", "n": self.total_keys_deleted}) + "\n")
+                for topic in sorted(self.queued - self.processed):
+                    file.write(json.dumps({"e": "queued", "topic": topic}, ensure_ascii=False) + "\n")
+                for topic, fingerprint in sorted(self.fingerprints.items()):
+                    event = dict({"e": "fingerprint", "topic": topic}, **fingerprint)
+                    file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                for name, value in sorted(self.cursors.items()):
+                    if value:
+                        file.write(json.dumps({"e": "cursor", "name": name, "value": value}) + "\n")
+
+            try:
+                _write_atomic(self.file_path, write)
+            finally:
+                self._file = open(self.file_path, 'a', encoding='utf-8')
+
+    def import_legacy(self, processed_path="processed_topics.json", deleted_path="deleted_topic.json",
+                      key_count_path="key_count.json"):
+        """Nạp trạng thái từ các file JSON cũ vào nhật ký"""
+        with self._lock:
+            processed = [t for t in _read_json(processed_path, []) if t not in self.processed]
+            deleted = [t for t in _read_json(deleted_path, []) if t not in self.deleted]
+            for topic in processed:
+                self.record_processed(topic)
+            for topic in deleted:
+                self.record_deleted(topic)
+            total = _read_json(key_count_path, {}).get("total_keys_deleted", 0)
+            if total:
+                self.record_key_count(total)
+            self.flush()
+        logger.info(f"Đã nhập từ file JSON cũ: {len(processed)} topic đã xử lý, "
+                     f"{len(deleted)} topic đã xóa, {total} key đã xóa")
+
+    def export_legacy(self, processed_path="processed_topics.json", deleted_path="deleted_topic.json",
+                      key_count_path="key_count.json"):
+        """Xuất trạng thái ra các file JSON cũ (cùng định dạng) để tương thích"""
+        with self._lock:
+            processed = sorted(self.processed)
+            deleted = sorted(self.deleted)
+            total = self.total_keys_deleted
+        _write_atomic(processed_path, lambda f: json.dump(processed, f, ensure_ascii=False, indent=4))
+        _write_atomic(deleted_path, lambda f: json.dump(deleted, f, ensure_ascii=False, indent=4))
+        _write_atomic(key_count_path,
+                      lambda f: json.dump({"total_keys_deleted": total}, f, ensure_ascii=False, indent=4))
+        logger.info(f"Đã xuất trạng thái ra {processed_path}, {deleted_path}, {key_count_path}")
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý nhật ký checkpoint (checkpoint.jsonl)")
+    parser.add_argument("command", choices=["import", "export", "compact"],
+                        help="import: nạp file JSON cũ; export: xuất ra file JSON cũ; compact: nén nhật ký")
+    parser.add_argument("--journal", default="checkpoint.jsonl")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    journal = CheckpointJournal(args.journal)
+    try:
+        if args.command == "import":
+            journal.import_legacy()
+        elif args.command == "export":
+            journal.export_legacy()
+        else:
+            journal.compact()
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
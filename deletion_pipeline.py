@@ -0,0 +1,170 @@
+import queue
+import sys
+import threading
+
+from logging_setup import get_logger
+from metrics import metrics
+from topic_discovery import parse_topic
+
+logger = get_logger("deletion")
+
+_STOP = object()
+
+
+class PageEnd:
+    """Mốc kết thúc một trang SCAN đi kèm dòng key, mang cursor của trang kế tiếp"""
+
+    __slots__ = ("cursor",)
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+
+def scan_stream(redis_helper, cursor=0, match="*", scan_count=1000):
+    """Giai đoạn quét: từng key của các trang SCAN, sau mỗi trang là một PageEnd"""
+    while True:
+        cursor, keys = redis_helper.scan_page(cursor, match, count=scan_count)
+        yield from keys
+        yield PageEnd(cursor)
+        if cursor == 0:
+            break
+
+
+def parse_stream(items):
+    """Giai đoạn tách topic: (topic, key) với topic được intern, bỏ qua key không có dạng prefix/.../topic"""
+    # Key không có '/' không khớp pattern '*/{topic}' nên cách xóa theo topic cũng không bao giờ đụng tới
+    for item in items:
+        if isinstance(item, PageEnd):
+            yield item
+        elif '/' in item:
+            yield sys.intern(parse_topic(item)), item
+
+
+def filter_stream(items, should_delete):
+    """Giai đoạn lọc: chỉ giữ key của topic cần xóa, kết quả should_delete được nhớ theo topic"""
+    decisions = {}
+    for item in items:
+        if isinstance(item, PageEnd):
+            yield item
+            continue
+        topic = item[0]
+        decision = decisions.get(topic)
+        if decision is None:
+            decision = decisions[topic] = bool(should_delete(topic))
+            metrics.inc("topics_checked")
+        if decision:
+            yield item
+
+
+def batch_stream(items, batch_size=500):
+    """Giai đoạn gom lô: (danh sách key, số key theo topic, cursor đã quét xong trọn vẹn hoặc None)"""
+    keys = []
+    topic_keys = {}
+    cursor = None
+    for item in items:
+        if isinstance(item, PageEnd):
+            # Cursor chỉ được checkpoint cùng lô chứa key cuối cùng của trang
+            cursor = item.cursor
+            if not keys:
+                yield [], {}, cursor
+                cursor = None
+            continue
+        topic, key = item
+        keys.append(key)
+        topic_keys[topic] = topic_keys.get(topic, 0) + 1
+        if len(keys) >= batch_size:
+            yield keys, topic_keys, cursor
+            keys, topic_keys, cursor = [], {}, None
+    if keys or cursor is not None:
+        yield keys, topic_keys, cursor
+
+
+class DeletionPipeline:
+    """Quét → tách topic → lọc → gom lô → UNLINK theo luồng, bộ nhớ chỉ phụ thuộc kích thước hàng đợi và số topic"""
+
+    def __init__(self, redis_helper, should_delete, workers=1, batch_size=500, scan_count=1000, queue_size=None,
+                 on_commit=None):
+        # on_commit(cursor, keys_deleted, new_topics): gọi theo đúng thứ tự lô khi mọi lô trước đó đã xóa xong;
+        # cursor là None nếu lô không kết thúc trang SCAN nào, new_topics là topic lần đầu có key bị xóa
+        self.redis_helper = redis_helper
+        self.should_delete = should_delete
+        self.workers = workers
+        self.batch_size = batch_size
+        self.scan_count = scan_count
+        self.on_commit = on_commit
+        # Hàng đợi có giới hạn tạo backpressure: SCAN dừng lại khi UNLINK không theo kịp
+        self.queue = queue.Queue(maxsize=queue_size or workers * 2)
+        self.topic_keys = {}  # topic -> số key đã xóa
+        self.keys_deleted = 0
+        self._lock = threading.Lock()
+        self._done = {}  # số thứ tự lô -> (cursor, số key đã xóa, số key theo topic, lỗi) chờ commit theo thứ tự
+        self._next_commit = 0
+        self.error = None  # lỗi của lô đầu tiên UNLINK thất bại; từ lô đó trở đi không checkpoint cursor nữa
+
+    def run(self, cursor=0, match="*"):
+        """Chạy hết pipeline từ cursor đã cho, trả về tổng số key đã xóa"""
+        threads = []
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"unlink-worker-{number + 1}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        try:
+            stream = scan_stream(self.redis_helper, cursor, match, self.scan_count)
+            stream = filter_stream(parse_stream(stream), self.should_delete)
+            for sequence, batch in enumerate(batch_stream(stream, self.batch_size)):
+                if self.error is not None:
+                    break
+                self.queue.put((sequence,) + batch)
+        finally:
+            for _ in threads:
+                self.queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+        logger.info(f"Pipeline xóa theo luồng: đã xóa {self.keys_deleted} key của {len(self.topic_keys)} topic")
+        if self.error is not None:
+            # Cursor đã lưu dừng ở lô lỗi, chạy lại (SessionSupervisor) sẽ quét và xóa lại từ đó
+            raise RuntimeError(f"Pipeline dừng do lô UNLINK lỗi: {self.error}") from self.error
+        return self.keys_deleted
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            sequence, keys, topic_keys, cursor = item
+            deleted = 0
+            error = None
+            try:
+                if keys and self.redis_helper.throttle is not None:
+                    self.redis_helper.throttle.acquire(len(keys))
+                deleted = self.redis_helper.unlink_keys(keys)
+            except Exception as e:
+                # Lô lỗi không được tính là đã xóa và chặn cursor tiến qua nó
+                logger.error(f"Lỗi khi UNLINK lô {sequence} ({len(keys)} key): {e}")
+                metrics.inc("errors")
+                topic_keys = {}
+                error = e
+            self._complete(sequence, cursor, deleted, topic_keys, error)
+
+    def _complete(self, sequence, cursor, deleted, topic_keys, error=None):
+        with self._lock:
+            self._done[sequence] = (cursor, deleted, topic_keys, error)
+            while self._next_commit in self._done:
+                cursor, deleted, topic_keys, error = self._done.pop(self._next_commit)
+                self._next_commit += 1
+                if error is not None and self.error is None:
+                    self.error = error
+                if self.error is not None:
+                    # Các lô sau lô lỗi vẫn được tính số key đã xóa nhưng không lưu cursor
+                    cursor = None
+                new_topics = [topic for topic in topic_keys if topic not in self.topic_keys]
+                for topic, count in topic_keys.items():
+                    self.topic_keys[topic] = self.topic_keys.get(topic, 0) + count
+                self.keys_deleted += deleted
+                metrics.inc("keys_deleted", deleted)
+                metrics.inc("topics_deleted", len(new_topics))
+                if self.on_commit is not None:
+                    try:
+                        self.on_commit(cursor, deleted, new_topics)
+                    except Exception as e:
+                        logger.error(f"Lỗi khi ghi checkpoint của pipeline: {e}")
@@ -0,0 +1,59 @@
+import json
+import time
+from datetime import datetime
+
+from logging_setup import get_logger
+from topic_discovery import TopicDiscovery
+
+logger = get_logger("discovery")
+
+
+def build_plan(redis_helper, topics, processed_topics, sample_size=10, workers=1, unlink_keys_per_sec=20000):
+    """Quét keyspace một lượt, tính danh sách topic sẽ xóa kèm số key, bộ nhớ ước tính và thời gian dự kiến"""
+    discovery = TopicDiscovery(redis_helper, sample_size=sample_size)
+    start = time.monotonic()
+    planned = [topic for topic in discovery.scan()
+               if topic not in processed_topics and topic not in topics]
+    scan_seconds = time.monotonic() - start
+    logger.info(f"Đã quét {discovery.total_keys} key trong {scan_seconds:.1f}s, "
+                 f"{len(planned)}/{len(discovery.counts)} topic sẽ bị xóa")
+
+    entries = []
+    for topic in planned:
+        keys = discovery.counts[topic]
+        samples = discovery.samples.get(topic, [])
+        memory = 0
+        if samples:
+            try:
+                usages = redis_helper.memory_usage(samples)
+                memory = int(sum(usages) / len(usages) * keys)
+            except Exception as e:
+                logger.warning(f"Không lấy được MEMORY USAGE cho topic {topic}: {e}")
+        entries.append({"topic": topic, "keys": keys, "estimated_memory_bytes": memory})
+    entries.sort(key=lambda entry: entry["keys"], reverse=True)
+
+    total_keys = sum(entry["keys"] for entry in entries)
+    # Mỗi topic cần một lượt SCAN toàn bộ keyspace (MATCH */topic) cộng thời gian UNLINK
+    projected_seconds = len(entries) * scan_seconds / max(workers, 1) + total_keys / unlink_keys_per_sec
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "keyspace_keys": discovery.total_keys,
+        "keyspace_topics": len(discovery.counts),
+        "scan_seconds": round(scan_seconds, 3),
+        "workers": workers,
+        "total_keys": total_keys,
+        "estimated_memory_bytes": sum(entry["estimated_memory_bytes"] for entry in entries),
+        "projected_seconds": round(projected_seconds, 1),
+        "topics": entries,
+    }
+
+
+def save_plan(plan, file_path="deletion_plan.json"):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(plan, file, ensure_ascii=False, indent=4)
+    logger.info(f"Đã lưu kế hoạch xóa {len(plan['topics'])} topic, {plan['total_keys']} key vào {file_path}")
+
+
+def load_plan(file_path="deletion_plan.json"):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,95 @@
+import queue
+import threading
+
+from logging_setup import get_logger
+from metrics import metrics
+
+logger = get_logger("deletion")
+
+_STOP = object()
+
+
+class DeletionScheduler:
+    """Xóa topic song song bằng một số worker cố định, nhận topic qua hàng đợi có giới hạn"""
+
+    def __init__(self, delete_func, workers=4, setup=None, teardown=None, queue_size=None, healthy=None):
+        # delete_func(context, topic): context là tài nguyên riêng của worker do setup() tạo
+        # (ví dụ một SeleniumHelper riêng), None nếu không có setup.
+        # healthy(context): sau mỗi lỗi, nếu trả về False thì worker tạo lại context (trình duyệt bị crash)
+        self.delete_func = delete_func
+        self.healthy = healthy
+        self.workers = workers
+        self.setup = setup
+        self.teardown = teardown
+        self.queue = queue.Queue(maxsize=queue_size or workers * 2)
+        self.threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"delete-worker-{number + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Đã khởi động {self.workers} worker xóa topic")
+
+    def submit(self, topic):
+        """Đưa topic vào hàng đợi, chờ nếu hàng đợi đầy để discovery không chạy quá xa"""
+        self.queue.put(topic)
+
+    def close(self):
+        """Chờ xóa hết các topic trong hàng đợi rồi dừng các worker"""
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        logger.info("Các worker xóa topic đã dừng")
+
+    def _recover(self, context):
+        """Tạo lại context của worker nếu nó không còn dùng được"""
+        if self.healthy is None or self.setup is None or self.healthy(context):
+            return context
+        name = threading.current_thread().name
+        logger.warning(f"Phiên làm việc của {name} đã mất, khởi tạo lại")
+        metrics.inc("worker_restarts")
+        if self.teardown is not None:
+            try:
+                self.teardown(context)
+            except Exception as e:
+                logger.warning(f"Lỗi khi đóng phiên cũ của {name}: {e}")
+        try:
+            return self.setup()
+        except Exception as e:
+            logger.error(f"Không khởi tạo lại được {name}: {e}")
+            return context
+
+    def _run(self):
+        context = None
+        try:
+            if self.setup is not None:
+                context = self.setup()
+        except Exception as e:
+            logger.error(f"Lỗi khi khởi tạo worker {threading.current_thread().name}: {e}")
+            # Vẫn phải lấy topic ra khỏi hàng đợi để submit()/close() không bị treo,
+            # topic bị bỏ qua chưa được lưu là đã xử lý nên lần chạy sau sẽ xóa lại
+            while True:
+                topic = self.queue.get()
+                if topic is _STOP:
+                    return
+                logger.error(f"Bỏ qua topic {topic} vì worker không khởi tạo được")
+
+        try:
+            while True:
+                topic = self.queue.get()
+                if topic is _STOP:
+                    break
+                try:
+                    self.delete_func(context, topic)
+                except Exception as e:
+                    logger.error(f"Lỗi khi xóa topic {topic} trong {threading.current_thread().name}: {e}")
+                    context = self._recover(context)
+        finally:
+            if self.teardown is not None and context is not None:
+                try:
+                    self.teardown(context)
+                except Exception as e:
+                    logger.error(f"Lỗi khi đóng worker {threading.current_thread().name}: {e}")
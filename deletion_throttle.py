@@ -0,0 +1,72 @@
+import threading
+import time
+
+from logging_setup import get_logger
+from metrics import metrics
+
+logger = get_logger("deletion")
+
+# Trần tốc độ khi chỉ dùng --target-latency-ms mà không đặt --max-keys-per-sec
+LATENCY_ONLY_MAX_KEYS_PER_SEC = 100000
+
+
+class DeletionThrottle:
+    """Giới hạn số key xóa mỗi giây và tự giảm tốc khi độ trễ Redis vượt ngưỡng mục tiêu"""
+
+    def __init__(self, max_keys_per_sec=5000, target_latency_ms=5.0,
+                 probe=None, sample_interval=1.0, min_keys_per_sec=100):
+        # probe(): hàm đo độ trễ server (giây), ví dụ RedisHelper.ping_latency
+        self.max_keys_per_sec = max_keys_per_sec
+        self.min_keys_per_sec = min(min_keys_per_sec, max_keys_per_sec)
+        self.target_latency = target_latency_ms / 1000.0
+        self.probe = probe
+        self.sample_interval = sample_interval
+        self.rate = max_keys_per_sec
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+        self._last_sample = 0.0
+        self._sampling = False
+
+    def acquire(self, keys):
+        """Chờ đến khi được phép xóa thêm `keys` key; dùng chung được cho nhiều worker"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + keys / self.rate
+        if start > now:
+            metrics.observe("throttle_wait", start - now)
+            time.sleep(start - now)
+        self._maybe_sample()
+
+    def _maybe_sample(self):
+        if self.probe is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._sampling or now - self._last_sample < self.sample_interval:
+                return
+            self._sampling = True
+            self._last_sample = now
+        try:
+            latency = self.probe()
+        except Exception as e:
+            logger.warning(f"Không đo được độ trễ Redis: {e}")
+            latency = None
+        finally:
+            with self._lock:
+                self._sampling = False
+        if latency is not None:
+            self._adjust(latency)
+
+    def _adjust(self, latency):
+        """Giảm một nửa tốc độ khi vượt ngưỡng, tăng dần lại khi server rảnh (AIMD)"""
+        with self._lock:
+            old_rate = self.rate
+            if latency > self.target_latency:
+                self.rate = max(self.min_keys_per_sec, self.rate / 2)
+            elif latency < self.target_latency / 2:
+                self.rate = min(self.max_keys_per_sec, self.rate + self.max_keys_per_sec * 0.1)
+            new_rate = self.rate
+        if new_rate != old_rate:
+            logger.info(f"Độ trễ Redis {latency * 1000:.1f}ms (mục tiêu {self.target_latency * 1000:.1f}ms), "
+                         f"tốc độ xóa {old_rate:.0f} -> {new_rate:.0f} key/s")
@@ -0,0 +1,88 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+# Logger theo thành phần, mức log của từng thành phần cấu hình riêng được
+COMPONENTS = {
+    "discovery": "delete_key.discovery",
+    "deletion": "delete_key.deletion",
+    "selenium": "delete_key.selenium",
+    "state": "delete_key.state",  # nhật ký checkpoint, file trạng thái và file cấu hình
+    "metrics": "delete_key.metrics",
+}
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def get_logger(component):
+    return logging.getLogger(COMPONENTS[component])
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Mỗi bản ghi log là một dòng JSON để đưa vào hệ thống thu thập log"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    """Nén file log cũ khi xoay vòng"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def parse_component_levels(text):
+    """Đọc chuỗi dạng 'discovery=WARNING,selenium=DEBUG' thành dict"""
+    levels = {}
+    for part in filter(None, (item.strip() for item in (text or "").split(","))):
+        component, _, level = part.partition("=")
+        if component not in COMPONENTS or not level:
+            raise ValueError(f"Cấu hình mức log không hợp lệ: '{part}' (thành phần: {', '.join(COMPONENTS)})")
+        levels[component] = level.upper()
+    return levels
+
+
+def setup_logging(file_path="logging.log", level="INFO", component_levels=None, json_format=False,
+                  max_bytes=10 * 1024 * 1024, backup_count=5, rotate_when=None):
+    """Cấu hình log chỉ ghi vào file qua QueueHandler/QueueListener, trả về listener để dừng khi kết thúc"""
+    # Luồng chính chỉ đưa bản ghi vào hàng đợi; ghi đĩa, xoay vòng và nén file chạy trên luồng của listener
+    if rotate_when:
+        file_handler = TimedRotatingFileHandler(file_path, when=rotate_when, backupCount=backup_count,
+                                                encoding='utf-8')
+    else:
+        file_handler = RotatingFileHandler(file_path, mode='a', maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding='utf-8')
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(JsonLinesFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+    logger = logging.getLogger()
+    logger.setLevel(level.upper())
+    # Xóa các handler cũ (nếu có) để tránh in ra terminal
+    logger.handlers = [QueueHandler(log_queue)]
+    for component, component_level in (component_levels or {}).items():
+        get_logger(component).setLevel(component_level)
+
+    listener.start()
+    return listener
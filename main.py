@@ -1,22 +1,34 @@
+import argparse
 import json
-import logging
-import time
 import re
+import threading
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium_helper import SeleniumHelper
+from selenium_helper import SeleniumHelper, TabPool
+from urllib.parse import quote, urlsplit
+from redis_helper import PartialDeleteError, RedisHelper, node_url, topic_pattern
+from topic_discovery import TopicDiscovery, parse_topic
+from deletion_scheduler import DeletionScheduler
+from deletion_pipeline import DeletionPipeline
+from checkpoint_journal import CheckpointJournal
+from topic_allowlist import TopicAllowlist
+from deletion_plan import build_plan, save_plan, load_plan
+from deletion_throttle import LATENCY_ONLY_MAX_KEYS_PER_SEC, DeletionThrottle
+from session_supervisor import SessionSupervisor
+from metrics import metrics
+from logging_setup import get_logger, parse_component_levels, setup_logging
 
-# Cấu hình logging chỉ ghi vào file
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+discovery_log = get_logger("discovery")
+deletion_log = get_logger("deletion")
+selenium_log = get_logger("selenium")
+state_log = get_logger("state")
 
-# Xóa các handler cũ (nếu có) để tránh in ra terminal
-logger.handlers = []
+# Nhật ký checkpoint dùng chung cho cả tiến trình (thay cho việc đọc/ghi lại cả file JSON mỗi topic)
+_journal = None
+_journal_lock = threading.Lock()
 
-# Tạo FileHandler với mode='a' để ghi đè log
-file_handler = logging.FileHandler('logging.log', mode='a', encoding='utf-8')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logger.addHandler(file_handler)
+# Số topic tối đa gửi trong một nhóm cho script Lua xóa nhiều topic trong một lượt quét
+LUA_TOPICS_PER_CALL = 100
 
 def load_account(file_path="account.json"):
     """Đọc thông tin tài khoản từ file JSON"""
@@ -25,79 +37,166 @@ def load_account(file_path="account.json"):
             data = json.load(file)
             return data.get("account", {}).get("url", "")
     except Exception as e:
-        logging.error(f"Lỗi khi đọc file {file_path}: {e}")
+        state_log.error(f"Lỗi khi đọc file {file_path}: {e}")
         return ""
 
-def load_topics(file_path="topic.json"):
-    """Đọc danh sách topic từ file JSON"""
+def load_redis_config(file_path="account.json"):
+    """Đọc cấu hình kết nối Redis (mục "redis" trong account.json, tùy chọn)"""
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
+            data = json.load(file)
+            return data.get("redis", {}) or {}
     except Exception as e:
-        logging.error(f"Lỗi khi đọc file {file_path}: {e}")
-        return []
+        state_log.error(f"Lỗi khi đọc file {file_path}: {e}")
+        return {}
 
-def load_processed_topics(file_path="processed_topics.json"):
-    """Đọc danh sách topic đã xử lý từ file JSON"""
+def create_redis_helper(redis_url=None, file_path="account.json"):
+    """Tạo kết nối Redis trực tiếp, trả về None nếu không có cấu hình hoặc không kết nối được"""
+    config = dict(load_redis_config(file_path))
+    config.pop("nodes", None)
+    url = redis_url or config.pop("url", None)
+    if not url and not config:
+        return None
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return []
+        redis_helper = RedisHelper(url=url, **config)
+        redis_helper.ping()
+        deletion_log.info("Đã kết nối trực tiếp tới Redis")
+        return redis_helper
     except Exception as e:
-        logging.error(f"Lỗi khi đọc file {file_path}: {e}")
+        deletion_log.error(f"Không thể kết nối tới Redis: {e}")
+        return None
+
+def load_redis_nodes(redis_nodes=None, redis_url=None, file_path="account.json"):
+    """Danh sách URL các instance Redis độc lập cần xóa song song (--redis-nodes hoặc mục "redis.nodes")"""
+    if redis_nodes:
+        return [url.strip() for url in redis_nodes.split(",") if url.strip()]
+    if redis_url:
+        # --redis-url chỉ định rõ một instance, không dùng danh sách node trong account.json
         return []
+    return list(load_redis_config(file_path).get("nodes") or [])
+
+def cluster_shard_urls(redis_helper, redis_url=None, file_path="account.json"):
+    """URL kết nối thẳng tới từng primary nếu server là Redis Cluster, None nếu là instance độc lập"""
+    primaries = redis_helper.cluster_primaries()
+    if not primaries:
+        return None
+    config = load_redis_config(file_path)
+    seed = redis_url or config.get("url")
+    if not seed:
+        password = config.get("password")
+        auth = f"{quote(config.get('username') or '')}:{quote(password)}@" if password else ""
+        seed = f"redis://{auth}{config.get('host', 'localhost')}:{config.get('port', 6379)}"
+    return [node_url(seed, address) for address in primaries]
+
+def shard_name(url):
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port or 6379}"
 
-def save_processed_topic(topic, file_path="processed_topics.json"):
-    """Lưu topic đã xử lý vào file JSON"""
+def load_topics(file_path="topic.json"):
+    """Đọc danh sách topic giữ lại từ file JSON (chuẩn hóa, hỗ trợ tiền tố/glob/regex)"""
     try:
-        processed_topics = load_processed_topics(file_path)
-        if topic not in processed_topics:
-            processed_topics.append(topic)
-            with open(file_path, 'w', encoding='utf-8') as file:
-                json.dump(processed_topics, file, ensure_ascii=False, indent=4)
-            logging.info(f"Đã lưu topic '{topic}' vào {file_path}")
+        topics = TopicAllowlist.from_file(file_path)
     except Exception as e:
-        logging.error(f"Lỗi khi lưu topic '{topic}' vào {file_path}: {e}")
+        state_log.error(f"Lỗi khi đọc file {file_path}: {e}")
+        return TopicAllowlist()
+    for error in topics.errors:
+        state_log.error(f"Luật không hợp lệ trong {file_path}: {error}")
+    return topics
 
-def save_deleted_topic(topic, file_path="deleted_topic.json"):
-    """Lưu topic đã xóa thành công vào file JSON"""
-    try:
-        deleted_topics = []
+def open_journal(file_path="checkpoint.jsonl"):
+    """Mở nhật ký checkpoint, lần đầu sẽ nhập trạng thái từ các file JSON cũ"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = CheckpointJournal(file_path)
+            if _journal.is_new:
+                _journal.import_legacy()
+        return _journal
+
+def close_journal(save=True):
+    """Xuất trạng thái ra các file JSON cũ, nén và đóng nhật ký (save=False: chỉ đóng, không ghi file trạng thái)"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            return
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                deleted_topics = json.load(file)
-        except FileNotFoundError:
-            pass
-        if topic not in deleted_topics:
-            deleted_topics.append(topic)
-            with open(file_path, 'w', encoding='utf-8') as file:
-                json.dump(deleted_topics, file, ensure_ascii=False, indent=4)
-            logging.info(f"Đã lưu topic '{topic}' vào {file_path}")
+            if save:
+                _journal.export_legacy()
+                _journal.compact()
+        except Exception as e:
+            state_log.error(f"Lỗi khi xuất/nén nhật ký checkpoint: {e}")
+        finally:
+            _journal.close()
+            _journal = None
+
+def load_processed_topics():
+    """Trả về tập topic đã xử lý (nạp từ nhật ký checkpoint)"""
+    return open_journal().processed
+
+def save_processed_topic(topic):
+    """Ghi topic đã xử lý vào nhật ký checkpoint"""
+    try:
+        if open_journal().record_processed(topic):
+            deletion_log.info(f"Đã lưu topic '{topic}' vào nhật ký checkpoint (processed)")
     except Exception as e:
-        logging.error(f"Lỗi khi lưu topic '{topic}' vào {file_path}: {e}")
+        deletion_log.error(f"Lỗi khi lưu topic đã xử lý '{topic}': {e}")
 
-def save_key_count(keys_deleted, file_path="key_count.json"):
-    """Lưu số key đã xóa cộng dồn vào file JSON"""
+def save_deleted_topic(topic):
+    """Ghi topic đã xóa thành công vào nhật ký checkpoint"""
     try:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                total_keys_deleted = data.get("total_keys_deleted", 0)
-        except FileNotFoundError:
-            total_keys_deleted = 0
-        except json.JSONDecodeError as e:
-            logging.error(f"Lỗi định dạng JSON trong {file_path}: {e}")
-            total_keys_deleted = 0
-        total_keys_deleted += keys_deleted
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump({"total_keys_deleted": total_keys_deleted}, file, ensure_ascii=False, indent=4)
-        logging.info(f"Đã lưu số key đã xóa: {keys_deleted}, tổng cộng: {total_keys_deleted} vào {file_path}")
+        journal = open_journal()
+        if journal.record_deleted(topic):
+            deletion_log.info(f"Đã lưu topic '{topic}' vào nhật ký checkpoint (deleted)")
+        # Topic vừa xóa không còn key, chế độ incremental sẽ xóa lại nếu key xuất hiện trở lại
+        journal.record_fingerprint(topic, 0)
+    except Exception as e:
+        deletion_log.error(f"Lỗi khi lưu topic đã xóa '{topic}': {e}")
+
+def save_fingerprint(topic, keys):
+    """Ghi số key của topic ở lượt quét này vào nhật ký checkpoint"""
+    try:
+        open_journal().record_fingerprint(topic, keys)
     except Exception as e:
-        logging.error(f"Lỗi khi lưu số key đã xóa vào {file_path}: {e}")
+        discovery_log.error(f"Lỗi khi lưu fingerprint của topic '{topic}': {e}")
+
+def load_cursor(name):
+    """Đọc vị trí quét đã checkpoint (None nếu lần trước đã quét xong hoặc chưa có)"""
+    return open_journal().cursors.get(name) or None
+
+def save_cursor(name, value):
+    """Checkpoint vị trí quét để tiếp tục sau khi chạy lại"""
+    try:
+        open_journal().record_cursor(name, value)
+    except Exception as e:
+        state_log.error(f"Lỗi khi lưu vị trí quét '{name}': {e}")
+
+def save_key_count(keys_deleted):
+    """Cộng dồn số key đã xóa vào nhật ký checkpoint"""
+    try:
+        total_keys_deleted = open_journal().record_key_count(keys_deleted)
+        deletion_log.info(f"Đã lưu số key đã xóa: {keys_deleted}, tổng cộng: {total_keys_deleted}")
+    except Exception as e:
+        deletion_log.error(f"Lỗi khi lưu số key đã xóa: {e}")
+
+def create_selenium(url, headless=False):
+    """Khởi động trình duyệt kèm một tab xóa key đã tải sẵn trang RedisInsight"""
+    selenium = SeleniumHelper(browser="chrome", headless=headless)
+    try:
+        selenium.tab_pool = TabPool(selenium, url, size=1)
+    except Exception as e:
+        selenium_log.warning(f"Không tạo được tab dùng lại, sẽ mở tab mới cho từng topic: {e}")
+    return selenium
+
+def close_selenium(selenium):
+    """Đóng trình duyệt, bỏ qua lỗi nếu phiên đã chết"""
+    try:
+        selenium.close_browser()
+        selenium_log.info("Đã đóng trình duyệt")
+    except Exception as e:
+        selenium_log.warning(f"Lỗi khi đóng trình duyệt: {e}")
 
 def delete_key_by_topic(selenium, topic, url):
-    """Xóa key theo topic đã cho trong tab mới"""
+    """Xóa key theo topic đã cho trong tab có sẵn của tab_pool (hoặc tab mới nếu không có pool), trả về False nếu lỗi"""
     # Định nghĩa các locator
     INPUT_SEARCH = "//input[@placeholder='Filter by Key Name or Pattern']"
     BULK_ACTION = "//span[contains(text(),'Bulk Actions')]"
@@ -106,14 +205,24 @@ def delete_key_by_topic(selenium, topic, url):
     CONFIRM_DELETE = "//button[contains(@class, '_deleteApproveBtn_') and contains(@class, 'euiButton--warning') and contains(@class, 'euiButton--small')]"
     DONE = "//span[@class='euiButton__text' and text()='Start New']"
 
+    tab_pool = selenium.tab_pool
+    tab = None
+    failed = False
+    # Chỉ thành công khi thấy nút DONE hoặc trang báo không có key ("Expected amount: N/A")
+    deleted = False
     try:
-        # Mở tab mới và truy cập URL
-        selenium.execute_javascript("window.open('');")
-        selenium.switch_to_new_window()
-        selenium.open_url(url)
-        time.sleep(5)  # Chờ trang tải
+        with metrics.timer("page_load"):
+            if tab_pool is not None:
+                # Dùng lại tab đã tải sẵn trang, không phải mở tab và chờ tải trang cho từng topic
+                tab = tab_pool.acquire()
+            else:
+                # Mở tab mới và truy cập URL
+                selenium.execute_javascript("window.open('');")
+                selenium.switch_to_new_window()
+                selenium.open_url(url)
+                selenium.wait_for_network_idle()  # Chờ trang tải
 
-        logging.info(f"Xử lý topic: {topic} trong tab mới")
+        deletion_log.info(f"Xử lý topic: {topic} trong tab xóa key")
         search_keyword = f"*/{topic}"
         
         # Kiểm tra và reload nếu INPUT_SEARCH không hiển thị
@@ -123,41 +232,44 @@ def delete_key_by_topic(selenium, topic, url):
             input_element = selenium.wait_for_element_to_appear(By.XPATH, INPUT_SEARCH, timeout=10)
             if input_element:
                 break
-            logging.info(f"Không tìm thấy INPUT_SEARCH, reload trang (lần {retry_count + 1}/{max_retries})")
-            selenium.driver.refresh()
-            time.sleep(5)
+            deletion_log.info(f"Không tìm thấy INPUT_SEARCH, reload trang (lần {retry_count + 1}/{max_retries})")
+            metrics.inc("retries")
+            with metrics.timer("page_load"):
+                selenium.refresh()
             retry_count += 1
         if not input_element:
-            logging.error(f"Không thể tìm thấy INPUT_SEARCH sau {max_retries} lần thử")
-            return
+            deletion_log.error(f"Không thể tìm thấy INPUT_SEARCH sau {max_retries} lần thử")
+            return False
 
-        # Nhập từ khóa vào ô input
-        selenium.input_text(By.XPATH, INPUT_SEARCH, search_keyword)
-        logging.info(f"Đã nhập từ khóa: {search_keyword}")
-        
-        # Nhấn Enter
-        search_input = selenium.find_element(By.XPATH, INPUT_SEARCH)
-        if search_input:
-            search_input.send_keys(Keys.ENTER)
-            logging.info(f"Đã nhấn Enter cho từ khóa: {search_keyword}")
-        
-        # Click nút Bulk Actions
-        selenium.click_element(By.XPATH, BULK_ACTION)
-        logging.info(f"Đã click nút Bulk Actions cho topic: {topic}")
-        
-        # Chờ để trang tải kết quả
-        selenium.wait_for_element_to_appear(By.XPATH, COUNT_TOTAL, timeout=10)
+        with metrics.timer("search"):
+            # Nhập từ khóa vào ô input
+            selenium.input_text(By.XPATH, INPUT_SEARCH, search_keyword)
+            deletion_log.info(f"Đã nhập từ khóa: {search_keyword}")
+
+            # Nhấn Enter
+            search_input = selenium.find_element(By.XPATH, INPUT_SEARCH)
+            if search_input:
+                search_input.send_keys(Keys.ENTER)
+                deletion_log.info(f"Đã nhấn Enter cho từ khóa: {search_keyword}")
+
+        with metrics.timer("count"):
+            # Click nút Bulk Actions
+            selenium.click_element(By.XPATH, BULK_ACTION)
+            deletion_log.info(f"Đã click nút Bulk Actions cho topic: {topic}")
+
+            # Chờ để trang tải kết quả
+            selenium.wait_for_element_to_appear(By.XPATH, COUNT_TOTAL, timeout=10)
         
         # Kiểm tra số lượng key
         count_element = selenium.find_element(By.XPATH, COUNT_TOTAL)
         if count_element:
             count_text = count_element.text
-            logging.info(f"Số lượng key tìm được: '{count_text}'")
+            deletion_log.info(f"Số lượng key tìm được: '{count_text}'")
             
             if "Expected amount: N/A" in count_text:
-                logging.info(f"Không có key để xóa cho topic {topic}. Reload trang...")
+                deletion_log.info(f"Không có key để xóa cho topic {topic}. Reload trang...")
                 selenium.driver.refresh()
-                return
+                return True
             
             elif "Expected amount: ~" in count_text:
                 # Trích xuất số key từ count_text
@@ -165,252 +277,739 @@ def delete_key_by_topic(selenium, topic, url):
                 if match:
                     # Loại bỏ tất cả khoảng trắng từ chuỗi số
                     key_str = re.sub(r'\s+', '', match.group(1)).strip()
-                    logging.info(f"Chuỗi số thô: '{match.group(1)}', Chuỗi sau xử lý: '{key_str}'")
+                    deletion_log.info(f"Chuỗi số thô: '{match.group(1)}', Chuỗi sau xử lý: '{key_str}'")
                     try:
                         keys_deleted = int(key_str) if key_str else 0
                     except ValueError as e:
-                        logging.error(f"Lỗi khi chuyển đổi chuỗi '{key_str}' thành số nguyên: {e}")
+                        deletion_log.error(f"Lỗi khi chuyển đổi chuỗi '{key_str}' thành số nguyên: {e}")
                         keys_deleted = 0
-                    logging.info(f"Số key sẽ xóa cho topic {topic}: {keys_deleted}")
+                    deletion_log.info(f"Số key sẽ xóa cho topic {topic}: {keys_deleted}")
                 else:
                     keys_deleted = 0
-                    logging.warning(f"Không trích xuất được số key từ '{count_text}' cho topic {topic}")
+                    deletion_log.warning(f"Không trích xuất được số key từ '{count_text}' cho topic {topic}")
                 
                 # Click nút Delete
-                selenium.click_element(By.XPATH, DELETE_BUTTON)
-                
-                # Click nút Confirm Delete
-                selenium.click_element(By.XPATH, CONFIRM_DELETE)
-                
-                # Tăng timeout cho nút DONE
-                done_element = selenium.wait_for_element_to_appear(By.XPATH, DONE, timeout=15)
+                with metrics.timer("delete"):
+                    selenium.click_element(By.XPATH, DELETE_BUTTON)
+
+                with metrics.timer("confirm"):
+                    # Click nút Confirm Delete
+                    selenium.click_element(By.XPATH, CONFIRM_DELETE)
+
+                    # Tăng timeout cho nút DONE
+                    done_element = selenium.wait_for_element_to_appear(By.XPATH, DONE, timeout=15)
                 if done_element:
-                    logging.info(f"Đã xóa key cho topic {topic} và xác nhận hoàn tất")
+                    deletion_log.info(f"Đã xóa key cho topic {topic} và xác nhận hoàn tất")
+                    metrics.inc("keys_deleted", keys_deleted)
+                    metrics.inc("topics_deleted")
                     # Lưu số key đã xóa chỉ khi xóa thành công
                     if keys_deleted > 0:
                         save_key_count(keys_deleted)
                     else:
-                        logging.warning(f"Số key bằng 0, không lưu vào key_count.json cho topic {topic}")
+                        deletion_log.warning(f"Số key bằng 0, không lưu vào key_count.json cho topic {topic}")
                     # Lưu topic vào deleted_topic.json
                     save_deleted_topic(topic)
+                    deleted = True
                 else:
-                    logging.warning(f"Không tìm thấy nút DONE sau khi xóa topic {topic}, không lưu số key")
+                    deletion_log.warning(f"Không tìm thấy nút DONE sau khi xóa topic {topic}, không lưu số key")
         
         # Reload trang
         selenium.driver.refresh()
-        logging.info(f"Đã reload trang sau khi xử lý topic {topic}")
+        deletion_log.info(f"Đã reload trang sau khi xử lý topic {topic}")
+        return deleted
         
     except Exception as e:
-        logging.error(f"Lỗi khi xử lý topic {topic} trong tab mới: {e}")
-        selenium.driver.refresh()
+        deletion_log.error(f"Lỗi khi xử lý topic {topic} trong tab xóa key: {e}")
+        try:
+            selenium.driver.refresh()
+        except Exception:
+            failed = True
+        return False
     finally:
-        # Đóng tab mới và quay lại tab ban đầu
-        selenium.driver.close()
-        selenium.switch_to_new_window()
-        logging.info("Đã đóng tab mới và quay lại tab ban đầu")
+        if tab_pool is not None:
+            if tab is not None:
+                # Trả tab về pool để dùng cho topic sau, đóng tab nếu không reload được
+                if failed:
+                    tab_pool.discard(tab)
+                else:
+                    tab_pool.release(tab)
+        else:
+            # Đóng tab mới và quay lại tab ban đầu
+            selenium.driver.close()
+            selenium.switch_to_new_window()
+            deletion_log.info("Đã đóng tab mới và quay lại tab ban đầu")
 
-def main():
-    selenium = SeleniumHelper(browser="chrome")
+def delete_key_by_topic_redis(redis_helper, topic):
+    """Xóa key theo topic trực tiếp qua Redis (SCAN MATCH + UNLINK), trả về False nếu lỗi"""
+    search_keyword = topic_pattern(topic)
+    deletion_log.info(f"Xử lý topic: {topic} qua Redis với pattern: {search_keyword}")
+    try:
+        with metrics.timer("redis_delete"):
+            keys_deleted = redis_helper.delete_keys_by_pattern(search_keyword)
+    except Exception as e:
+        deletion_log.error(f"Lỗi khi xóa key qua Redis cho topic {topic}: {e}")
+        metrics.inc("errors")
+        if isinstance(e, PartialDeleteError):
+            record_topic_keys(topic, e.deleted, "Redis (một phần)")
+        return False
 
+    record_topic_keys(topic, keys_deleted, "Redis")
+    return True
+
+def record_topic_keys(topic, keys_deleted, via):
+    """Ghi nhận số key đã xóa của topic vào metrics và nhật ký checkpoint"""
+    metrics.inc("keys_deleted", keys_deleted)
+    if keys_deleted > 0:
+        metrics.inc("topics_deleted")
+        deletion_log.info(f"Đã xóa {keys_deleted} key cho topic {topic} qua {via}")
+        save_key_count(keys_deleted)
+        save_deleted_topic(topic)
+    else:
+        deletion_log.info(f"Không có key để xóa cho topic {topic}")
+
+def delete_topic_group(redis_helper, group):
+    """Xóa key của một nhóm topic bằng một lượt quét keyspace trên server (script Lua) thay vì mỗi topic một lượt"""
+    deletion_log.info(f"Xử lý {len(group)} topic qua script Lua: {', '.join(group)}")
     try:
-        url = load_account()
-        if not url:
-            logging.error("Không tìm thấy URL trong file account.json")
-            return
+        with metrics.timer("redis_delete"):
+            topic_keys = redis_helper.delete_topics(group)
+    except Exception as e:
+        # Không lưu processed, các topic vẫn nằm trong hàng đợi của nhật ký và được xóa lại ở lần chạy sau
+        deletion_log.error(f"Lỗi khi xóa nhóm {len(group)} topic qua script Lua: {e}")
+        metrics.inc("errors")
+        if isinstance(e, PartialDeleteError):
+            # Các key đã bị UNLINK ở những lần gọi trước lỗi vẫn phải được tính vào key_count
+            for topic, keys_deleted in e.topic_keys.items():
+                record_topic_keys(topic, keys_deleted, "script Lua (một phần)")
+        return
+    for topic in group:
+        record_topic_keys(topic, topic_keys.get(topic, 0), "script Lua")
+        save_processed_topic(topic)
+
+def delete_topic(topic, url, selenium=None, redis_helper=None):
+    """Xóa key theo topic bằng backend Redis nếu có, nếu lỗi thì dùng Selenium; trả về False nếu không xóa được"""
+    if redis_helper is not None:
+        if delete_key_by_topic_redis(redis_helper, topic):
+            return True
+        if selenium is None:
+            return False
+        deletion_log.warning(f"Backend Redis lỗi, chuyển sang RedisInsight (Selenium) cho topic {topic}")
+    return delete_key_by_topic(selenium, topic, url)
+
+def delete_and_save_topic(topic, url, selenium=None, redis_helper=None):
+    """Xóa topic rồi ghi nhận topic đã xử lý (chỉ khi xóa thành công)"""
+    with metrics.timer("topic"):
+        deleted = delete_topic(topic, url, selenium=selenium, redis_helper=redis_helper)
+    if deleted:
+        save_processed_topic(topic)
+    else:
+        # Topic vẫn nằm trong hàng đợi của nhật ký, lần chạy sau (hoặc lần khởi động lại) sẽ xóa lại
+        deletion_log.warning(f"Chưa xóa được topic {topic}, giữ lại trong hàng đợi để thử lại")
+
+def submit_topic(topic, url, scheduler=None, selenium=None, redis_helper=None):
+    """Ghi nhận topic cần xóa vào nhật ký rồi xóa ngay hoặc đưa vào hàng đợi của worker"""
+    open_journal().record_queued(topic)
+    if scheduler is not None:
+        scheduler.submit(topic)
+    else:
+        delete_and_save_topic(topic, url, selenium=selenium, redis_helper=redis_helper)
+
+def submit_pending_topics(submit):
+    """Xóa tiếp các topic đã vào hàng đợi nhưng chưa xong ở lần chạy bị gián đoạn"""
+    pending = open_journal().pending_topics()
+    if pending:
+        deletion_log.info(f"Tiếp tục xóa {len(pending)} topic còn dở từ lần chạy trước")
+    for topic in pending:
+        submit(topic)
+
+def revisit_changed_topics(counts, known_topics, topics, submit):
+    """Chế độ incremental: cập nhật fingerprint sau một lượt quét trọn vẹn và xóa lại topic đã xử lý nhưng có thêm key"""
+    # submit(topic): cách lượt chạy hiện tại đưa topic đi xóa (xóa ngay, qua worker hoặc theo nhóm script Lua)
+    fingerprints = open_journal().fingerprints
+    revisited = 0
+    for topic, keys in counts.items():
+        if topic in topics:
+            save_fingerprint(topic, keys)
+        elif topic in known_topics:
+            previous = fingerprints.get(topic, {}).get("keys")
+            if previous is None or keys > previous:
+                # Topic đã xóa có fingerprint 0 nên mọi key còn lại đều là key mới xuất hiện sau lần xóa
+                discovery_log.info(f"Topic '{topic}' đã xử lý nhưng có thêm key: {keys} key "
+                                   f"(lần trước: {previous or 0}). Thực hiện xóa lại...")
+            else:
+                # Số key không tăng: topic được giữ lại ở lần trước và nay đã bị bỏ khỏi topic.json
+                discovery_log.info(f"Topic '{topic}' đã bị bỏ khỏi topic.json ({keys} key, lần trước giữ lại "
+                                   f"{previous}). Thực hiện xóa...")
+            metrics.inc("topics_revisited")
+            submit(topic)
+            revisited += 1
+    discovery_log.info(f"Incremental: {revisited} topic đã xử lý được xóa lại (có thêm key hoặc bị bỏ khỏi topic.json)")
+
+def create_scheduler(workers, url, redis_helper=None, headless=False):
+    """Tạo bộ lập lịch xóa song song: dùng chung kết nối Redis, hoặc mỗi worker một trình duyệt riêng"""
+    if redis_helper is not None:
+        scheduler = DeletionScheduler(
+            lambda _, topic: delete_and_save_topic(topic, url, redis_helper=redis_helper),
+            workers=workers)
+    else:
+        scheduler = DeletionScheduler(
+            lambda selenium, topic: delete_and_save_topic(topic, url, selenium=selenium),
+            workers=workers,
+            setup=lambda: create_selenium(url, headless=headless),
+            teardown=lambda selenium: selenium.close_browser(),
+            healthy=lambda selenium: selenium.is_alive())
+    scheduler.start()
+    return scheduler
+
+def run_redis_cleanup(redis_helper, url="", workers=1, incremental=False):
+    """Tìm topic bằng một lượt SCAN trên keyspace và xóa các topic không có trong topic.json"""
+    topics = load_topics()
+    if not topics:
+        discovery_log.error("Không tìm thấy topic trong file topic.json")
+        return
+
+    processed_topics = load_processed_topics()
+    if not processed_topics:
+        discovery_log.info("Chưa có topic nào đã xử lý, bắt đầu từ danh sách rỗng")
+
+    # Tập topic đã xử lý trước lượt chạy này, để chế độ incremental so với fingerprint sau khi quét xong
+    known_topics = open_journal().processed_snapshot() if incremental else None
+    if redis_helper.use_lua:
+        # Script Lua: gom topic thành nhóm, mỗi nhóm một lượt quét keyspace trên server thay vì mỗi topic một lượt
+        scheduler = create_group_scheduler(workers, redis_helper) if workers > 1 else None
+        group = []
+
+        def submit(topic):
+            open_journal().record_queued(topic)
+            group.append(topic)
+            if len(group) >= LUA_TOPICS_PER_CALL:
+                submit_topic_group(list(group), redis_helper, scheduler=scheduler)
+                group.clear()
+    else:
+        scheduler = create_scheduler(workers, url, redis_helper=redis_helper) if workers > 1 else None
+        group = None
+
+        def submit(topic):
+            submit_topic(topic, url, scheduler=scheduler, redis_helper=redis_helper)
+    discovery = TopicDiscovery(redis_helper)
+    cursor = load_cursor("redis_scan") or 0
+    if cursor:
+        discovery_log.info(f"Tiếp tục quét keyspace từ cursor {cursor}")
+    try:
+        submit_pending_topics(submit)
+        for topic in discovery.scan(cursor, on_page=lambda next_cursor: save_cursor("redis_scan", next_cursor)):
+            discovery_log.info(f"Phát hiện topic mới khi quét keyspace: {topic}")
+            metrics.inc("topics_checked")
+            if topic in processed_topics:
+                discovery_log.info(f"Topic '{topic}' đã được xử lý trước đó. Bỏ qua...")
+                continue
+
+            if topic not in topics:
+                discovery_log.info(f"Topic '{topic}' không có trong topic.json. Thực hiện xóa...")
+                submit(topic)
+            else:
+                discovery_log.info(f"Topic '{topic}' có trong topic.json. Bỏ qua...")
+                save_processed_topic(topic)
+
+        if incremental:
+            if cursor:
+                # Số key đếm được khi quét tiếp từ cursor chỉ là một phần keyspace, không so được với fingerprint
+                discovery_log.info("Incremental: lượt quét tiếp tục từ checkpoint, bỏ qua so sánh fingerprint")
+            else:
+                revisit_changed_topics(discovery.counts, known_topics, topics, submit)
+        if group:
+            submit_topic_group(list(group), redis_helper, scheduler=scheduler)
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+
+    discovery_log.info(f"Đã quét xong keyspace: {discovery.total_keys} key, {len(discovery.counts)} topic")
+
+def stream_delete(redis_helper, topics, workers=1, batch_size=500, cursor_name="redis_stream", label=""):
+    """Chạy DeletionPipeline trên một kết nối, tiếp tục từ cursor đã lưu với tên cursor_name"""
+    cursor = load_cursor(cursor_name) or 0
+    if cursor:
+        discovery_log.info(f"{label}Tiếp tục xóa theo luồng từ cursor {cursor}")
+
+    def on_commit(next_cursor, keys_deleted, new_topics):
+        # Chỉ gọi khi mọi lô trước đó đã xóa xong nên cursor lưu lại không bao giờ vượt quá phần đã xóa
+        for topic in new_topics:
+            deletion_log.info(f"{label}Topic '{topic}' không có trong topic.json, đang xóa key theo luồng")
+            save_deleted_topic(topic)
+        if keys_deleted:
+            save_key_count(keys_deleted)
+        if next_cursor is not None:
+            save_cursor(cursor_name, next_cursor)
 
+    pipeline = DeletionPipeline(redis_helper, lambda topic: topic not in topics, workers=workers,
+                                batch_size=batch_size, on_commit=on_commit)
+    pipeline.run(cursor)
+    return pipeline
+
+def run_redis_stream(redis_helper, workers=1, batch_size=500):
+    """Xóa theo luồng trong một lượt SCAN: key của topic không có trong topic.json được UNLINK ngay theo lô"""
+    topics = load_topics()
+    if not topics:
+        discovery_log.error("Không tìm thấy topic trong file topic.json")
+        return
+    pipeline = stream_delete(redis_helper, topics, workers=workers, batch_size=batch_size)
+    for topic in pipeline.topic_keys:
+        save_processed_topic(topic)
+
+def run_sharded_cleanup(shard_urls, create_helper, workers=1, batch_size=500, finished=None):
+    """Mỗi shard (primary của cluster hoặc instance độc lập) một luồng SCAN + xóa riêng, các shard chạy song song"""
+    # finished: shard đã xong -> topic đã xóa, giữ qua các lần SessionSupervisor chạy lại để không quét lại shard xong
+    topics = load_topics()
+    if not topics:
+        discovery_log.error("Không tìm thấy topic trong file topic.json")
+        return
+    finished = {} if finished is None else finished
+    errors = {}
+
+    def run_shard(url):
+        name = shard_name(url)
+        redis_helper = None
+        try:
+            redis_helper = create_helper(url)
+            pipeline = stream_delete(redis_helper, topics, workers=workers, batch_size=batch_size,
+                                     cursor_name=f"redis_stream:{name}", label=f"[{name}] ")
+            finished[url] = set(pipeline.topic_keys)
+            discovery_log.info(f"[{name}] Đã xong shard: {pipeline.keys_deleted} key của "
+                               f"{len(pipeline.topic_keys)} topic")
+        except Exception as e:
+            errors[name] = e
+            discovery_log.error(f"[{name}] Lỗi khi xử lý shard: {e}")
+        finally:
+            if redis_helper is not None:
+                redis_helper.close()
+
+    pending = [url for url in shard_urls if url not in finished]
+    discovery_log.info(f"Xóa song song trên {len(pending)}/{len(shard_urls)} shard: "
+                       f"{', '.join(shard_name(url) for url in pending)}")
+    threads = [threading.Thread(target=run_shard, args=(url,), name=f"shard-{shard_name(url)}", daemon=True)
+               for url in pending]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        # Để SessionSupervisor chạy lại, các shard lỗi tiếp tục từ cursor đã lưu của riêng shard đó
+        raise RuntimeError(f"{len(errors)} shard lỗi: {', '.join(errors)}")
+
+    # Topic chỉ coi là đã xử lý khi mọi shard đã quét xong
+    for topic in set().union(*finished.values()):
+        save_processed_topic(topic)
+
+def run_dry_run(redis_helper, plan_file, workers=1, max_keys_per_sec=0):
+    """Tính kế hoạch xóa (topic, số key, bộ nhớ, thời gian dự kiến) mà không xóa key nào"""
+    topics = load_topics()
+    if not topics:
+        discovery_log.error("Không tìm thấy topic trong file topic.json")
+        return
+    options = {"unlink_keys_per_sec": max_keys_per_sec} if max_keys_per_sec > 0 else {}
+    plan = build_plan(redis_helper, topics, load_processed_topics(), workers=workers, **options)
+    save_plan(plan, plan_file)
+
+def run_plan(plan_file, url, selenium=None, redis_helper=None, workers=1, headless=False):
+    """Xóa đúng các topic trong kế hoạch đã lưu, bỏ qua topic đã xử lý ở lần chạy trước"""
+    plan = load_plan(plan_file)
+    processed_topics = load_processed_topics()
+    pending = [entry["topic"] for entry in plan["topics"] if entry["topic"] not in processed_topics]
+    deletion_log.info(f"Thực hiện kế hoạch {plan_file} (tạo lúc {plan.get('created_at')}): "
+                 f"còn {len(pending)}/{len(plan['topics'])} topic cần xóa")
+
+    if redis_helper is not None and redis_helper.use_lua:
+        run_plan_groups(redis_helper, pending, workers)
+        return
+
+    scheduler = create_scheduler(workers, url, redis_helper=redis_helper, headless=headless) if workers > 1 else None
+    try:
+        for topic in pending:
+            submit_topic(topic, url, scheduler=scheduler, selenium=selenium, redis_helper=redis_helper)
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+
+def create_group_scheduler(workers, redis_helper):
+    """Tạo bộ lập lịch xóa song song theo nhóm topic bằng script Lua, dùng chung kết nối Redis"""
+    scheduler = DeletionScheduler(lambda _, group: delete_topic_group(redis_helper, group), workers=workers)
+    scheduler.start()
+    return scheduler
+
+def submit_topic_group(group, redis_helper, scheduler=None):
+    """Xóa ngay một nhóm topic hoặc đưa vào hàng đợi của worker"""
+    if scheduler is not None:
+        scheduler.submit(group)
+    else:
+        delete_topic_group(redis_helper, group)
+
+def run_plan_groups(redis_helper, pending, workers=1):
+    """Xóa các topic của kế hoạch theo nhóm, mỗi nhóm một lượt quét keyspace bằng script Lua"""
+    journal = open_journal()
+    for topic in pending:
+        journal.record_queued(topic)
+    scheduler = create_group_scheduler(workers, redis_helper) if workers > 1 else None
+    try:
+        for start in range(0, len(pending), LUA_TOPICS_PER_CALL):
+            submit_topic_group(pending[start:start + LUA_TOPICS_PER_CALL], redis_helper, scheduler=scheduler)
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+
+def restore_list_position(selenium, list_xpath, scan_more_xpath, position):
+    """Đưa danh sách về vị trí đã checkpoint: click lại Scan more đủ số lần rồi cuộn tới scrollTop đã lưu"""
+    for number in range(position.get("scan_more", 0)):
+        if not selenium.find_elements(By.XPATH, scan_more_xpath):
+            discovery_log.info(f"Hết nút 'Scan more' sau {number} lần khi khôi phục vị trí")
+            break
+        list_element = selenium.find_element(By.XPATH, list_xpath)
+        row_count = selenium.count_children(list_element)
+        selenium.execute_javascript("arguments[0].scrollTop = arguments[0].scrollHeight;", list_element)
+        selenium.click_element(By.XPATH, scan_more_xpath)
+        selenium.wait_for_row_count_change(list_element, row_count, timeout=10)
+    list_element = selenium.find_element(By.XPATH, list_xpath)
+    selenium.execute_javascript("arguments[0].scrollTop = arguments[1];", list_element, position.get("scroll_top", 0))
+    selenium.wait_for_scroll_settle(list_element, settle_time=0.2)
+    discovery_log.info(f"Đã khôi phục vị trí danh sách: {position}")
+
+def run_selenium_cleanup(selenium, url, scheduler=None, incremental=False):
+    """Duyệt danh sách key trên RedisInsight theo từng lô item đang hiển thị và xóa topic không có trong topic.json"""
+    LIST = "/html/body/div/div/div[1]/main/div[2]/div[1]/div/div/div[1]/div/div[2]/div[1]/div/div[1]/div/div/div[2]/div/div/div/div/div/div[2]"
+    ITEM_NAMES = "./div/div/div[2]/div/div/div/div/div/span"  # Tên key của từng dòng, tương đối với LIST
+    SCAN_MORE = "//span[contains(text(),'Scan more')]"
+
+    with metrics.timer("page_load"):
         selenium.open_url(url)
-        time.sleep(5)  # Chờ trang tải
+        selenium.wait_for_network_idle()  # Chờ trang tải
 
-        topics = load_topics()
-        if not topics:
-            logging.error("Không tìm thấy topic trong file topic.json")
-            return
+    topics = load_topics()
+    if not topics:
+        discovery_log.error("Không tìm thấy topic trong file topic.json")
+        return
 
-        processed_topics = load_processed_topics()
-        if not processed_topics:
-            logging.info("Không có topic nào trong processed_topics.json, bắt đầu từ danh sách rỗng")
+    processed_topics = load_processed_topics()
+    if not processed_topics:
+        discovery_log.info("Chưa có topic nào đã xử lý, bắt đầu từ danh sách rỗng")
 
-        ITEMS = "/html/body/div/div/div[1]/main/div[2]/div[1]/div/div/div[1]/div/div[2]/div[1]/div/div[1]/div/div/div[2]/div/div/div/div/div/div[2]/div/div[{index}]/div[2]/div/div/div/div/div/span"
-        LIST = "/html/body/div/div/div[1]/main/div[2]/div[1]/div/div/div[1]/div/div[2]/div[1]/div/div[1]/div/div/div[2]/div/div/div/div/div/div[2]"
-        SCAN_MORE = "//span[contains(text(),'Scan more')]"
+    # Kiểm tra và reload nếu LIST không hiển thị
+    max_retries = 3
+    retry_count = 0
+    while retry_count < max_retries:
+        list_element = selenium.wait_for_element_to_appear(By.XPATH, LIST, timeout=10)
+        if list_element:
+            break
+        discovery_log.info(f"Không tìm thấy LIST, reload trang (lần {retry_count + 1}/{max_retries})")
+        selenium.refresh()
+        retry_count += 1
+    if not list_element:
+        discovery_log.error(f"Không thể tìm thấy LIST sau {max_retries} lần thử")
+        return
 
-        # Kiểm tra và reload nếu LIST không hiển thị
-        max_retries = 3
-        retry_count = 0
-        while retry_count < max_retries:
-            list_element = selenium.wait_for_element_to_appear(By.XPATH, LIST, timeout=10)
-            if list_element:
-                break
-            logging.info(f"Không tìm thấy LIST, reload trang (lần {retry_count + 1}/{max_retries})")
-            selenium.driver.refresh()
-            time.sleep(5)
-            retry_count += 1
-        if not list_element:
-            logging.error(f"Không thể tìm thấy LIST sau {max_retries} lần thử")
-            return
+    seen_keys = set()  # Khử trùng lặp theo tên key thay vì vị trí div[index]
+    seen_topics = set()  # Mỗi topic chỉ xử lý một lần trong lượt chạy, kể cả khi đang chờ worker xóa
+    topic_counts = {}  # Số key theo topic trong danh sách, chỉ dùng cho chế độ incremental
+    known_topics = open_journal().processed_snapshot() if incremental else None
+    position = {"scan_more": 0, "scroll_top": 0}
+    saved_position = load_cursor("ui_list")
+    if saved_position:
+        # Tiếp tục từ vị trí đã checkpoint thay vì duyệt lại từ đầu danh sách
+        restore_list_position(selenium, LIST, SCAN_MORE, saved_position)
+        position = dict(saved_position)
 
-        index = 1
-        while True:
-            try:
-                item_xpath = ITEMS.format(index=index)
-                item_element = selenium.wait_for_element_to_appear(By.XPATH, item_xpath, timeout=5)
-                if not item_element:
-                    scrolled_to_top = False  # Biến theo dõi trạng thái cuộn lại từ đầu
-                    scroll_attempts = 0  # Đếm số lần cuộn
-                    # Cuộn trong element LIST một đoạn vừa đủ
-                    while scroll_attempts < 10:
-                        list_element = selenium.find_element(By.XPATH, LIST)
-                        if list_element:
-                            # Lưu vị trí cuộn trước đó
-                            scroll_position_before = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                            logging.info(f"Đang cuộn trong element LIST để tìm item tại index {index} (lần cuộn {scroll_attempts + 1}/10)")
-                            # Cuộn một đoạn bằng 50% chiều cao của LIST
-                            selenium.execute_javascript("arguments[0].scrollTop += arguments[0].clientHeight * 0.5;", list_element)
-                            logging.info("Đã cuộn một đoạn trong element LIST để tải thêm item")
-                            time.sleep(2)  # Chờ item tải
-                            # Kiểm tra lại item
-                            item_element = selenium.wait_for_element_to_appear(By.XPATH, item_xpath, timeout=5)
-                            if item_element:
-                                break
-                            # Kiểm tra vị trí cuộn mới
-                            scroll_position_after = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                            if scroll_position_before == scroll_position_after:
-                                if not scrolled_to_top:
-                                    # Cuộn lại từ đầu nếu đã cuộn hết mà không tìm thấy
-                                    selenium.execute_javascript("arguments[0].scrollTop = 0;", list_element)
-                                    logging.info(f"Đã cuộn lại từ đầu LIST để thử tìm item tại index {index}")
-                                    scrolled_to_top = True
-                                    time.sleep(2)  # Chờ sau khi cuộn lại
-                                    scroll_attempts += 1
-                                    continue
-                                else:
-                                    logging.info("Không thể cuộn thêm trong element LIST và đã thử cuộn lại từ đầu")
-                                    break
-                            scroll_attempts += 1
-                    
-                    if not item_element:
-                        if scroll_attempts >= 10:
-                            # Reload trang và bắt đầu lại từ index 1
-                            logging.info(f"Đã cuộn {scroll_attempts} lần mà không tìm thấy item tại index {index}. Reload trang và bắt đầu lại từ index 1.")
-                            selenium.driver.refresh()
-                            time.sleep(5)  # Chờ trang tải
-                            index = 1  # Đặt lại index
-                            scrolled_to_top = False  # Đặt lại trạng thái cuộn
-                            continue
-                        
-                        # Thử click nút Scan more nếu không tìm thấy item sau khi cuộn
-                        scan_more = selenium.find_element(By.XPATH, SCAN_MORE)
-                        if scan_more:
-                            selenium.click_element(By.XPATH, SCAN_MORE)
-                            logging.info("Đã click nút 'Scan more' để tải thêm item")
-                            selenium.wait_for_element_to_appear(By.XPATH, item_xpath, timeout=10)
-                            item_element = selenium.find_element(By.XPATH, item_xpath)
-                        else:
-                            logging.info("Không tìm thấy nút 'Scan more'. Kết thúc lặp item.")
-                            break
-
-                item_text = item_element.text
-                logging.info(f"Kiểm tra item: {item_text}")
-
-                topic = item_text.split('/')[-1] if '/' in item_text else item_text
+    def submit(topic):
+        submit_topic(topic, url, scheduler=scheduler, selenium=selenium)
 
-                # Kiểm tra xem topic đã được xử lý trước đó chưa
-                if topic in processed_topics:
-                    logging.info(f"Topic '{topic}' đã được xử lý trước đó. Bỏ qua...")
-                    save_processed_topic(topic)  # Vẫn lưu để đảm bảo nhất quán
-                    # Cuộn nhanh hơn vì topic không thỏa mãn
-                    list_element = selenium.find_element(By.XPATH, LIST)
-                    if list_element:
-                        scroll_position_before = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                        selenium.execute_javascript("arguments[0].scrollTop += arguments[0].clientHeight * 1.0;", list_element)
-                        logging.info("Đã cuộn nhanh trong element LIST vì topic đã xử lý")
-                        time.sleep(1)  # Chờ ngắn hơn
-                        scroll_position_after = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                        if scroll_position_before == scroll_position_after:
-                            logging.info("Không thể cuộn thêm trong element LIST")
-                    index += 1
+    submit_pending_topics(submit)
+
+    error_count = 0
+    max_errors = 10
+    while True:
+        try:
+            with metrics.timer("list_read"):
+                batch = selenium.get_visible_items(LIST, ITEM_NAMES)
+            if batch is None:
+                raise RuntimeError("Không tìm thấy LIST trên trang")
+
+            new_keys = [key for key in batch["items"] if key not in seen_keys]
+            for item_text in new_keys:
+                seen_keys.add(item_text)
+                topic = parse_topic(item_text)
+                if incremental:
+                    topic_counts[topic] = topic_counts.get(topic, 0) + 1
+                if topic in seen_topics:
                     continue
+                seen_topics.add(topic)
+                discovery_log.info(f"Kiểm tra item: {item_text}")
+                metrics.inc("topics_checked")
 
-                if topic not in topics:
-                    logging.info(f"Topic '{topic}' không có trong topic.json. Thực hiện xóa...")
-                    delete_key_by_topic(selenium, topic, url)  # Xóa trong tab mới
-                    save_processed_topic(topic)  # Lưu topic sau khi xóa
+                # Kiểm tra xem topic đã được xử lý trước đó chưa
+                if topic in processed_topics:
+                    discovery_log.info(f"Topic '{topic}' đã được xử lý trước đó. Bỏ qua...")
+                elif topic not in topics:
+                    discovery_log.info(f"Topic '{topic}' không có trong topic.json. Thực hiện xóa...")
+                    submit(topic)
                 else:
-                    logging.info(f"Topic '{topic}' có trong topic.json. Bỏ qua...")
+                    discovery_log.info(f"Topic '{topic}' có trong topic.json. Bỏ qua...")
                     save_processed_topic(topic)  # Lưu topic dù không xóa
-                    # Cuộn nhanh hơn vì topic không thỏa mãn
+
+            position["scroll_top"] = batch["scrollTop"]
+            save_cursor("ui_list", dict(position))
+
+            at_bottom = batch["scrollTop"] + batch["clientHeight"] >= batch["scrollHeight"] - 1
+            if not at_bottom:
+                # Cuộn gần một trang, giữ lại một phần để không bỏ sót dòng của danh sách ảo
+                with metrics.timer("scroll"):
                     list_element = selenium.find_element(By.XPATH, LIST)
-                    if list_element:
-                        scroll_position_before = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                        selenium.execute_javascript("arguments[0].scrollTop += arguments[0].clientHeight * 1.0;", list_element)
-                        logging.info("Đã cuộn nhanh trong element LIST vì topic có trong topic.json")
-                        time.sleep(1)  # Chờ ngắn hơn
-                        scroll_position_after = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                        if scroll_position_before == scroll_position_after:
-                            logging.info("Không thể cuộn thêm trong element LIST")
-
-                index += 1
-
-            except Exception as e:
-                logging.error(f"Lỗi khi kiểm tra item tại index {index}: {e}")
-                scrolled_to_top = False  # Biến theo dõi trạng thái cuộn lại từ đầu
-                scroll_attempts = 0  # Đếm số lần cuộn
-                # Cuộn trong element LIST một đoạn vừa đủ
-                while scroll_attempts < 10:
+                    selenium.execute_javascript("arguments[0].scrollTop += arguments[0].clientHeight * 0.9;", list_element)
+                    selenium.wait_for_scroll_settle(list_element, settle_time=0.2)
+                error_count = 0
+                continue
+
+            # Đã cuộn hết danh sách hiện tại: thử click nút Scan more để tải thêm item
+            if selenium.find_elements(By.XPATH, SCAN_MORE):
+                with metrics.timer("scan_more"):
                     list_element = selenium.find_element(By.XPATH, LIST)
-                    if list_element:
-                        # Lưu vị trí cuộn trước đó
-                        scroll_position_before = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                        # Cuộn một đoạn bằng 50% chiều cao của LIST
-                        selenium.execute_javascript("arguments[0].scrollTop += arguments[0].clientHeight * 0.5;", list_element)
-                        logging.info(f"Đã cuộn một đoạn trong element LIST để tải thêm item sau lỗi (lần cuộn {scroll_attempts + 1}/10)")
-                        time.sleep(2)  # Chờ item tải
-                        # Kiểm tra lại item
-                        item_element = selenium.wait_for_element_to_appear(By.XPATH, item_xpath, timeout=5)
-                        if item_element:
-                            break
-                        # Kiểm tra vị trí cuộn mới
-                        scroll_position_after = selenium.execute_javascript("return arguments[0].scrollTop;", list_element)
-                        if scroll_position_before == scroll_position_after:
-                            if not scrolled_to_top:
-                                # Cuộn lại từ đầu nếu đã cuộn hết mà không tìm thấy
-                                selenium.execute_javascript("arguments[0].scrollTop = 0;", list_element)
-                                logging.info(f"Đã cuộn lại từ đầu LIST để thử tìm item tại index {index} sau lỗi")
-                                scrolled_to_top = True
-                                time.sleep(2)  # Chờ sau khi cuộn lại
-                                scroll_attempts += 1
-                                continue
-                            else:
-                                logging.info("Không thể cuộn thêm trong element LIST và đã thử cuộn lại từ đầu")
-                                break
-                        scroll_attempts += 1
-                
-                if not item_element:
-                    if scroll_attempts >= 10:
-                        # Reload trang và bắt đầu lại từ index 1
-                        logging.info(f"Đã cuộn {scroll_attempts} lần mà không tìm thấy item tại index {index} sau lỗi. Reload trang và bắt đầu lại từ index 1.")
-                        selenium.driver.refresh()
-                        time.sleep(5)  # Chờ trang tải
-                        index = 1  # Đặt lại index
-                        scrolled_to_top = False  # Đặt lại trạng thái cuộn
-                        continue
-                    
-                    # Thử click nút Scan more nếu không tìm thấy item sau khi cuộn
-                    scan_more = selenium.find_element(By.XPATH, SCAN_MORE)
-                    if scan_more:
-                        selenium.click_element(By.XPATH, SCAN_MORE)
-                        logging.info("Đã click nút 'Scan more' để tải thêm item sau lỗi")
-                        continue
-                    else:
-                        logging.info("Không tìm thấy nút 'Scan more'. Kết thúc lặp item.")
-                        break
+                    row_count = selenium.count_children(list_element)
+                    selenium.click_element(By.XPATH, SCAN_MORE)
+                    position["scan_more"] += 1
+                    discovery_log.info(f"Đã click nút 'Scan more' để tải thêm item (đã kiểm tra {len(seen_keys)} key)")
+                    selenium.wait_for_row_count_change(list_element, row_count, timeout=10)
+                error_count = 0
+                continue
+
+            discovery_log.info(f"Không tìm thấy nút 'Scan more'. Kết thúc lặp item, đã kiểm tra {len(seen_keys)} key.")
+            save_cursor("ui_list", None)  # Đã duyệt hết, lần sau bắt đầu lại từ đầu
+            if incremental:
+                if saved_position:
+                    discovery_log.info("Incremental: lượt duyệt tiếp tục từ checkpoint, bỏ qua so sánh fingerprint")
+                else:
+                    revisit_changed_topics(topic_counts, known_topics, topics, submit)
+            break
+
+        except Exception as e:
+            if not selenium.is_alive():
+                # Phiên WebDriver đã chết, để SessionSupervisor khởi động lại trình duyệt
+                raise
+            error_count += 1
+            metrics.inc("retries")
+            discovery_log.error(f"Lỗi khi đọc danh sách item (lần {error_count}/{max_errors}): {e}")
+            if error_count >= max_errors:
+                discovery_log.error("Quá nhiều lỗi liên tiếp, dừng duyệt danh sách")
+                break
+            # Reload trang rồi quay lại vị trí đang duyệt, các key đã kiểm tra được bỏ qua nhờ seen_keys
+            selenium.refresh()
+            if selenium.wait_for_element_to_appear(By.XPATH, LIST, timeout=10):
+                restore_list_position(selenium, LIST, SCAN_MORE, position)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Xóa key Redis theo topic không có trong topic.json")
+    parser.add_argument("--backend", choices=["auto", "redis", "selenium"], default="auto",
+                        help="Backend xóa key: auto dùng Redis nếu kết nối được, nếu không dùng Selenium")
+    parser.add_argument("--redis-url", default=None,
+                        help="URL Redis (mặc định đọc mục 'redis' trong account.json)")
+    parser.add_argument("--redis-nodes", default=None,
+                        help="Danh sách URL các instance Redis độc lập (cách nhau bởi dấu phẩy) để xóa song song từng shard")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Số topic được xóa song song (Selenium: mỗi worker một trình duyệt riêng)")
+    parser.add_argument("--headless", action="store_true",
+                        help="Chạy Chrome không giao diện, tắt ảnh/extension và giới hạn cache")
+    parser.add_argument("--journal", default="checkpoint.jsonl",
+                        help="File nhật ký checkpoint (JSONL), trạng thái được xuất lại ra các file JSON cũ khi kết thúc")
+    parser.add_argument("--stream", action="store_true",
+                        help="Backend Redis: xóa theo luồng trong một lượt SCAN thay vì quét lại keyspace cho từng topic")
+    parser.add_argument("--lua", action="store_true",
+                        help="Backend Redis: SCAN + UNLINK trong script Lua trên server, kế hoạch xóa theo nhóm topic")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Lưu fingerprint theo topic và xóa lại topic đã xử lý nếu có key mới xuất hiện")
+    parser.add_argument("--processed-ttl-hours", type=float, default=0,
+                        help="Topic đã xử lý quá số giờ này được xét lại từ đầu (0 = không hết hạn)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Chỉ quét và ghi kế hoạch xóa ra --plan-file, không xóa key nào (cần Redis)")
+    parser.add_argument("--plan-file", default="deletion_plan.json", help="File kế hoạch cho --dry-run")
+    parser.add_argument("--execute-plan", default=None, metavar="PLAN_FILE",
+                        help="Xóa đúng các topic trong file kế hoạch, không quét lại keyspace")
+    parser.add_argument("--max-keys-per-sec", type=int, default=0,
+                        help="Giới hạn tổng số key xóa mỗi giây qua Redis, chia chung cho mọi shard "
+                             "(0 = không giới hạn cố định, vẫn tự giảm tốc theo --target-latency-ms)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Số key mỗi lô UNLINK")
+    parser.add_argument("--target-latency-ms", type=float, default=5.0,
+                        help="Độ trễ PING mục tiêu, vượt ngưỡng thì tự giảm tốc độ xóa (0 = tắt)")
+    parser.add_argument("--max-restarts", type=int, default=5,
+                        help="Số lần tự khởi động lại trình duyệt/kết nối khi phiên bị mất")
+    parser.add_argument("--metrics-file", default="metrics.json", help="File tóm tắt metrics dạng JSON")
+    parser.add_argument("--metrics-prom", default=None, help="File metrics dạng Prometheus text (tùy chọn)")
+    parser.add_argument("--metrics-interval", type=float, default=60.0,
+                        help="Chu kỳ (giây) ghi metrics trong lúc chạy, 0 = chỉ ghi khi kết thúc")
+    parser.add_argument("--log-file", default="logging.log", help="File log")
+    parser.add_argument("--log-level", default="INFO", help="Mức log chung")
+    parser.add_argument("--component-log-level", default="",
+                        help="Mức log theo thành phần (discovery, deletion, selenium, state, metrics), "
+                             "ví dụ 'discovery=WARNING,selenium=DEBUG'")
+    parser.add_argument("--log-json", action="store_true", help="Ghi log dạng JSON lines")
+    parser.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024,
+                        help="Kích thước tối đa của file log trước khi xoay vòng (file cũ được nén gzip)")
+    parser.add_argument("--log-backups", type=int, default=5, help="Số file log cũ được giữ lại")
+    parser.add_argument("--log-rotate-when", default=None,
+                        help="Xoay vòng theo thời gian thay vì kích thước (ví dụ 'midnight', 'H')")
+    return parser.parse_args(argv)
+
+def create_throttle(args, probe):
+    """Tạo DeletionThrottle theo --max-keys-per-sec và --target-latency-ms, None nếu cả hai đều tắt"""
+    if args.max_keys_per_sec <= 0 and args.target_latency_ms <= 0:
+        return None
+    return DeletionThrottle(
+        # Không đặt giới hạn cố định: chỉ tự giảm tốc theo độ trễ, bắt đầu từ trần LATENCY_ONLY_MAX_KEYS_PER_SEC
+        max_keys_per_sec=args.max_keys_per_sec if args.max_keys_per_sec > 0 else LATENCY_ONLY_MAX_KEYS_PER_SEC,
+        target_latency_ms=args.target_latency_ms,
+        probe=probe if args.target_latency_ms > 0 else None)
+
+def apply_redis_options(redis_helper, args, throttle=None):
+    """Gắn các tùy chọn xóa (kích thước lô, script Lua, giới hạn tốc độ) vào một kết nối Redis"""
+    # throttle: DeletionThrottle dùng chung giữa nhiều kết nối, None = tạo riêng cho kết nối này
+    redis_helper.batch_size = args.batch_size
+    redis_helper.use_lua = args.lua and not redis_helper.cluster_node
+    redis_helper.throttle = throttle or create_throttle(args, redis_helper.ping_latency)
+    return redis_helper
 
+def run_shards(args, shard_urls, cluster_node=False):
+    """Backend Redis nhiều shard: xóa theo luồng trên từng shard song song, tiếp tục theo cursor của từng shard"""
+    if args.dry_run or args.execute_plan:
+        deletion_log.error("--dry-run và --execute-plan chưa hỗ trợ nhiều shard, hãy trỏ --redis-url tới một instance")
+        return
+    if args.incremental or args.lua:
+        deletion_log.error("--incremental và --lua chưa hỗ trợ nhiều shard, hãy trỏ --redis-url tới một instance")
+        return
+    discovery_log.info("Nhiều shard: xóa theo luồng trên từng shard, không bỏ qua topic đã xử lý ở lần chạy trước")
+    supervisor = SessionSupervisor(max_restarts=args.max_restarts)
+    finished = {}
+    helpers = {}  # url -> kết nối đang dùng của shard, để đo độ trễ cho throttle chung
+
+    def shard_latency():
+        # Độ trễ lớn nhất trong các shard chưa xong: shard chậm nhất quyết định tốc độ chung
+        return max((helper.ping_latency() for url, helper in list(helpers.items()) if url not in finished),
+                   default=0.0)
+
+    # Một throttle cho mọi shard để --max-keys-per-sec là giới hạn tổng, không phải nhân theo số shard
+    throttle = create_throttle(args, shard_latency)
+
+    def create_helper(url):
+        # Node của cluster chỉ giữ một phần slot nên UNLINK từng key; instance độc lập được xóa theo lô như bình thường
+        helper = helpers[url] = apply_redis_options(RedisHelper(url=url, cluster_node=cluster_node), args,
+                                                    throttle=throttle)
+        return helper
+
+    try:
+        supervisor.run(lambda: run_sharded_cleanup(
+            shard_urls, create_helper, workers=args.workers, batch_size=args.batch_size, finished=finished))
     except Exception as e:
-        logging.error(f"Lỗi trong quá trình xử lý: {e}")
+        deletion_log.error(f"Lỗi trong quá trình xử lý: {e}")
+
+def run(args):
+    redis_helper = None
+    if args.backend in ("auto", "redis"):
+        shard_urls = load_redis_nodes(args.redis_nodes, args.redis_url)
+        if shard_urls:
+            run_shards(args, shard_urls)
+            return
+        redis_helper = create_redis_helper(args.redis_url)
+        if redis_helper is None and args.backend == "redis":
+            deletion_log.error("Không kết nối được Redis với backend 'redis'")
+            return
+        if redis_helper is not None:
+            shard_urls = cluster_shard_urls(redis_helper, args.redis_url)
+            if shard_urls:
+                discovery_log.info(f"Phát hiện Redis Cluster với {len(shard_urls)} primary")
+                redis_helper.close()
+                run_shards(args, shard_urls, cluster_node=True)
+                return
+            apply_redis_options(redis_helper, args)
+
+    if args.dry_run:
+        if redis_helper is None:
+            discovery_log.error("Chế độ --dry-run cần kết nối Redis trực tiếp (--redis-url hoặc mục 'redis' trong account.json)")
+            return
+        try:
+            run_dry_run(redis_helper, args.plan_file, workers=args.workers, max_keys_per_sec=args.max_keys_per_sec)
+        except Exception as e:
+            discovery_log.error(f"Lỗi khi lập kế hoạch xóa: {e}")
+        finally:
+            redis_helper.close()
+        return
+
+    supervisor = SessionSupervisor(max_restarts=args.max_restarts)
+
+    if redis_helper is not None:
+        url = load_account()
+        try:
+            # redis-py tự kết nối lại ở lệnh kế tiếp, lần chạy lại tiếp tục từ cursor SCAN đã lưu
+            if args.execute_plan:
+                supervisor.run(lambda: run_plan(args.execute_plan, url, redis_helper=redis_helper, workers=args.workers))
+            elif args.stream:
+                supervisor.run(lambda: run_redis_stream(redis_helper, workers=args.workers,
+                                                        batch_size=args.batch_size))
+            else:
+                supervisor.run(lambda: run_redis_cleanup(redis_helper, url, workers=args.workers,
+                                                         incremental=args.incremental))
+        except Exception as e:
+            deletion_log.error(f"Lỗi trong quá trình xử lý: {e}")
+        finally:
+            redis_helper.close()
+        return
+
+    url = load_account()
+    if not url:
+        selenium_log.error("Không tìm thấy URL trong file account.json")
+        return
+
+    def selenium_session():
+        # Mỗi lần (khởi động lại) tạo trình duyệt mới, mở lại URL trong account.json và tiếp tục từ checkpoint
+        selenium = create_selenium(url, headless=args.headless)
+        try:
+            if args.execute_plan:
+                run_plan(args.execute_plan, url, selenium=selenium, workers=args.workers, headless=args.headless)
+            else:
+                run_selenium_cleanup(selenium, url, scheduler=scheduler, incremental=args.incremental)
+        finally:
+            close_selenium(selenium)
+
+    scheduler = None
+    try:
+        if args.workers > 1 and not args.execute_plan:
+            scheduler = create_scheduler(args.workers, url, headless=args.headless)
+        supervisor.run(selenium_session)
+
+    except Exception as e:
+        deletion_log.error(f"Lỗi trong quá trình xử lý: {e}")
 
     finally:
-        selenium.close_browser()
-        logging.info("Đã đóng trình duyệt")
+        if scheduler is not None:
+            scheduler.close()
+
+def main(argv=None):
+    args = parse_args(argv)
+    listener = setup_logging(
+        file_path=args.log_file,
+        level=args.log_level,
+        component_levels=parse_component_levels(args.component_log_level),
+        json_format=args.log_json,
+        max_bytes=args.log_max_bytes,
+        backup_count=args.log_backups,
+        rotate_when=args.log_rotate_when)
+    journal = open_journal(args.journal)
+    # --dry-run chỉ lập kế hoạch, không được thay đổi trạng thái đã lưu
+    if args.processed_ttl_hours > 0 and not args.dry_run:
+        expired = journal.expire_processed(args.processed_ttl_hours * 3600)
+        if expired:
+            discovery_log.info(f"{len(expired)} topic đã xử lý quá {args.processed_ttl_hours:g} giờ, sẽ được xét lại")
+    if args.metrics_interval > 0:
+        metrics.start_periodic(args.metrics_interval, args.metrics_file, args.metrics_prom)
+    try:
+        run(args)
+    finally:
+        metrics.stop_periodic()
+        metrics.write(args.metrics_file, args.metrics_prom)
+        close_journal(save=not args.dry_run)
+        listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from logging_setup import get_logger
+
+logger = get_logger("metrics")
+
+# Ngưỡng (giây) của histogram độ trễ theo pha
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+class Metrics:
+    """Đo độ trễ theo pha (histogram), đếm key/topic/lần thử lại và xuất tóm tắt JSON + Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = None
+        self._writer = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.phases = {}
+            self.counters = {}
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = {"count": 0, "sum": 0.0, "min": seconds, "max": seconds, "buckets": [0] * len(BUCKETS)}
+                self.phases[phase] = stats
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["min"] = min(stats["min"], seconds)
+            stats["max"] = max(stats["max"], seconds)
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][index] += 1
+                    break
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        with self._lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            phases = {}
+            for phase, stats in self.phases.items():
+                phases[phase] = {
+                    "count": stats["count"],
+                    "total_seconds": round(stats["sum"], 3),
+                    "mean_seconds": round(stats["sum"] / stats["count"], 4),
+                    "min_seconds": round(stats["min"], 4),
+                    "max_seconds": round(stats["max"], 4),
+                    "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                                for bound, count in zip(BUCKETS, stats["buckets"])},
+                }
+            counters = dict(self.counters)
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "elapsed_seconds": round(elapsed, 3),
+            "keys_per_sec": round(counters.get("keys_deleted", 0) / elapsed, 2),
+            "topics_per_min": round(counters.get("topics_deleted", 0) * 60 / elapsed, 2),
+            "counters": counters,
+            "phases": phases,
+        }
+
+    def to_prometheus(self, prefix="delete_key"):
+        summary = self.summary()
+        lines = [
+            f"# TYPE {prefix}_elapsed_seconds gauge",
+            f"{prefix}_elapsed_seconds {summary['elapsed_seconds']}",
+            f"# TYPE {prefix}_keys_per_second gauge",
+            f"{prefix}_keys_per_second {summary['keys_per_sec']}",
+            f"# TYPE {prefix}_topics_per_minute gauge",
+            f"{prefix}_topics_per_minute {summary['topics_per_min']}",
+        ]
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_phase_seconds histogram")
+        for phase, stats in sorted(summary["phases"].items()):
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {stats["total_seconds"]}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=None, prometheus_path=None):
+        """Ghi tóm tắt ra file (qua file tạm + os.replace để bên đọc không thấy file ghi dở)"""
+        outputs = []
+        if json_path:
+            outputs.append((json_path, json.dumps(self.summary(), ensure_ascii=False, indent=4)))
+        if prometheus_path:
+            outputs.append((prometheus_path, self.to_prometheus()))
+        for file_path, content in outputs:
+            try:
+                tmp_path = f"{file_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    file.write(content)
+                os.replace(tmp_path, file_path)
+            except OSError as e:
+                logger.error(f"Lỗi khi ghi metrics vào {file_path}: {e}")
+
+    def start_periodic(self, interval, json_path=None, prometheus_path=None):
+        """Ghi tóm tắt định kỳ trong lúc chạy"""
+        stop = self._stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.write(json_path, prometheus_path)
+
+        self._writer = threading.Thread(target=loop, name="metrics-writer", daemon=True)
+        self._writer.start()
+
+    def stop_periodic(self):
+        """Dừng ghi định kỳ và chờ lần ghi đang dở xong, để không tranh file tạm với lần ghi cuối"""
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+
+# Đối tượng metrics dùng chung cho cả tiến trình
+metrics = Metrics()
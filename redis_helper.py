@@ -0,0 +1,241 @@
+import re
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from metrics import metrics
+
+try:
+    import redis
+except ImportError:  # redis là phụ thuộc tùy chọn, chỉ cần cho backend Redis
+    redis = None
+
+# Các ký tự đặc biệt trong glob pattern của SCAN MATCH
+_GLOB_SPECIAL = re.compile(r'([\\*?\[\]])')
+
+# Số key tối đa mỗi lệnh UNLINK trong script: unpack() của Lua bị giới hạn bởi kích thước stack
+LUA_UNLINK_LIMIT = 5000
+
+# Script chạy trên server: tối đa max_pages lượt SCAN rồi UNLINK ngay các key khớp, trả về
+# {cursor tiếp theo, số key đã xóa, topic1, số key topic1, ...}. Nhiều topic thì SCAN MATCH '*/*' và lọc
+# theo phần cuối của key; mỗi lần gọi bị giới hạn số trang nên không chặn server lâu.
+# ARGV: cursor, match, count, max_pages, số key mỗi lệnh UNLINK, [topic...]
+DELETE_SCRIPT = """
+local cursor = ARGV[1]
+local count = tonumber(ARGV[3])
+local max_pages = tonumber(ARGV[4])
+local unlink_size = tonumber(ARGV[5])
+local wanted = nil
+if #ARGV > 5 then
+    wanted = {}
+    for i = 6, #ARGV do
+        wanted[ARGV[i]] = 0
+    end
+end
+local deleted = 0
+for page = 1, max_pages do
+    local reply = redis.call('SCAN', cursor, 'MATCH', ARGV[2], 'COUNT', count)
+    cursor = reply[1]
+    local batch = {}
+    for _, key in ipairs(reply[2]) do
+        if wanted == nil then
+            batch[#batch + 1] = key
+        else
+            local topic = string.match(key, '([^/]*)$')
+            if wanted[topic] ~= nil then
+                wanted[topic] = wanted[topic] + 1
+                batch[#batch + 1] = key
+            end
+        end
+        if #batch >= unlink_size then
+            deleted = deleted + redis.call('UNLINK', unpack(batch))
+            batch = {}
+        end
+    end
+    if #batch > 0 then
+        deleted = deleted + redis.call('UNLINK', unpack(batch))
+    end
+    if cursor == '0' then
+        break
+    end
+end
+local result = {cursor, deleted}
+if wanted ~= nil then
+    for topic, n in pairs(wanted) do
+        if n > 0 then
+            result[#result + 1] = topic
+            result[#result + 1] = n
+        end
+    end
+end
+return result
+"""
+
+
+def escape_pattern(text):
+    """Escape các ký tự glob để SCAN MATCH khớp đúng nguyên văn"""
+    return _GLOB_SPECIAL.sub(r'\\\1', text)
+
+
+def topic_pattern(topic):
+    """Pattern tương đương ô tìm kiếm '*/{topic}' trên RedisInsight"""
+    return f"*/{escape_pattern(topic)}"
+
+
+class PartialDeleteError(Exception):
+    """Lỗi giữa chừng khi xóa bằng script, kèm số key các lần gọi trước đã xóa xong"""
+
+    def __init__(self, error, deleted, topic_keys):
+        super().__init__(f"{error} (đã xóa {deleted} key trước khi lỗi)")
+        self.deleted = deleted
+        self.topic_keys = topic_keys
+
+
+def node_url(url, address):
+    """URL kết nối thẳng tới một node (host:port), giữ nguyên scheme, tài khoản/mật khẩu và db của URL gốc"""
+    parts = urlsplit(url)
+    credentials = parts.netloc.rpartition("@")[0]
+    return urlunsplit(parts._replace(netloc=f"{credentials}@{address}" if credentials else address))
+
+
+def parse_cluster_nodes(text, default_host="localhost"):
+    """Địa chỉ host:port của các primary còn sống và đang giữ slot, từ kết quả CLUSTER NODES"""
+    primaries = []
+    for line in text.splitlines():
+        # <id> <ip:port@cport[,hostname]> <flags> <master> <ping> <pong> <epoch> <link-state> <slot>...
+        fields = line.split()
+        if len(fields) < 9:
+            continue
+        flags = fields[2].split(",")
+        if "master" not in flags or {"fail", "fail?", "noaddr", "handshake"} & set(flags):
+            continue
+        host, _, port = fields[1].split("@")[0].split(",")[0].rpartition(":")
+        primaries.append(f"{host or default_host}:{port}")
+    return primaries
+
+
+class RedisHelper:
+    def __init__(self, url=None, client=None, throttle=None, use_lua=False, cluster_node=False, **kwargs):
+        # throttle: DeletionThrottle dùng chung cho mọi lần xóa qua helper này (None = không giới hạn)
+        # use_lua: xóa theo pattern bằng script chạy trên server (SCAN + UNLINK trong một lần gọi)
+        # cluster_node: kết nối thẳng tới một primary của cluster, UNLINK từng key để tránh lỗi CROSSSLOT
+        self.throttle = throttle
+        self.use_lua = use_lua
+        self.cluster_node = cluster_node
+        self.batch_size = 500  # số key mỗi lô UNLINK khi xóa theo pattern
+        self._delete_script = None
+        if client is not None:
+            self.client = client
+        elif redis is None:
+            raise RuntimeError("Chưa cài thư viện redis (pip install redis)")
+        elif url:
+            self.client = redis.Redis.from_url(url, decode_responses=True)
+        else:
+            self.client = redis.Redis(decode_responses=True, **kwargs)
+
+    def ping(self):
+        return self.client.ping()
+
+    def ping_latency(self):
+        """Thời gian khứ hồi (giây) của một lệnh PING"""
+        start = time.perf_counter()
+        self.client.ping()
+        return time.perf_counter() - start
+
+    def scan_keys(self, pattern="*", count=1000):
+        """Duyệt key theo pattern bằng SCAN tăng dần (không chặn server như KEYS)"""
+        return self.client.scan_iter(match=pattern, count=count)
+
+    def scan_page(self, cursor=0, pattern="*", count=1000):
+        """Một lệnh SCAN, trả về (cursor tiếp theo, danh sách key); cursor 0 nghĩa là đã quét hết"""
+        with metrics.timer("scan_page"):
+            return self.client.scan(cursor=cursor, match=pattern, count=count)
+
+    def unlink_keys(self, keys, chunk_size=100):
+        """Xóa một lô key bằng UNLINK trong một pipeline, trả về số key đã xóa thực tế"""
+        if not keys:
+            return 0
+        if self.cluster_node:
+            chunk_size = 1
+        with metrics.timer("unlink_batch"):
+            pipe = self.client.pipeline(transaction=False)
+            for start in range(0, len(keys), chunk_size):
+                pipe.unlink(*keys[start:start + chunk_size])
+            return sum(pipe.execute())
+
+    def delete_keys_by_pattern(self, pattern, batch_size=None, scan_count=1000):
+        """Xóa toàn bộ key khớp pattern theo từng lô, trả về tổng số key đã xóa"""
+        if self.use_lua:
+            return self.delete_by_script(pattern, scan_count=scan_count)[0]
+        batch_size = batch_size or self.batch_size
+        deleted = 0
+        batch = []
+        for key in self.scan_keys(pattern, count=scan_count):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += self._unlink_throttled(batch)
+                batch = []
+        deleted += self._unlink_throttled(batch)
+        return deleted
+
+    def _unlink_throttled(self, keys):
+        if keys and self.throttle is not None:
+            self.throttle.acquire(len(keys))
+        return self.unlink_keys(keys)
+
+    def delete_by_script(self, match, topics=(), scan_count=1000, max_pages=10):
+        """Gọi lặp script xóa trên server tới khi quét hết, trả về (tổng số key đã xóa, {topic: số key})"""
+        if self._delete_script is None:
+            # register_script dùng EVALSHA, tự nạp lại script nếu server trả về NOSCRIPT
+            self._delete_script = self.client.register_script(DELETE_SCRIPT)
+        cursor = 0
+        deleted = 0
+        topic_keys = {}
+        while True:
+            try:
+                with metrics.timer("script_call"):
+                    result = self._delete_script(args=[cursor, match, scan_count, max_pages,
+                                                       min(self.batch_size, LUA_UNLINK_LIMIT), *topics])
+            except Exception as e:
+                if not deleted:
+                    raise
+                # Key của các lần gọi trước đã bị UNLINK thật, bên gọi cần ghi nhận trước khi báo lỗi
+                raise PartialDeleteError(e, deleted, topic_keys) from e
+            cursor = int(result[0])
+            deleted += int(result[1])
+            for index in range(2, len(result), 2):
+                topic = result[index]
+                topic_keys[topic] = topic_keys.get(topic, 0) + int(result[index + 1])
+            if self.throttle is not None and result[1]:
+                # Script đã xóa xong nên chỉ có thể giãn lần gọi kế tiếp theo số key vừa xóa
+                self.throttle.acquire(int(result[1]))
+            if cursor == 0:
+                return deleted, topic_keys
+
+    def delete_topics(self, topics, scan_count=1000, max_pages=10):
+        """Xóa key của nhiều topic trong cùng một lượt quét keyspace bằng script, trả về {topic: số key}"""
+        return self.delete_by_script("*/*", topics, scan_count=scan_count, max_pages=max_pages)[1]
+
+    def cluster_primaries(self):
+        """Các primary (host:port) nếu server chạy Redis Cluster, None nếu là instance độc lập"""
+        try:
+            # Gọi tách "CLUSTER", "NODES" để nhận chuỗi gốc thay vì dict đã parse (khác nhau giữa các bản redis-py)
+            nodes = self.client.execute_command("CLUSTER", "NODES")
+        except Exception:
+            # Instance độc lập trả lỗi "cluster support disabled"
+            return None
+        if isinstance(nodes, bytes):
+            nodes = nodes.decode("utf-8")
+        host = self.client.connection_pool.connection_kwargs.get("host", "localhost")
+        return parse_cluster_nodes(nodes, default_host=host) or None
+
+    def memory_usage(self, keys):
+        """Dung lượng bộ nhớ (byte) của từng key theo MEMORY USAGE, gửi trong một pipeline"""
+        if not keys:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        return [usage or 0 for usage in pipe.execute()]
+
+    def close(self):
+        self.client.close()
@@ -1,14 +1,84 @@
+import os
+import time
 from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
+from logging_setup import get_logger
+
+logger = get_logger("selenium")
+
+# Chu kỳ kiểm tra mặc định của các hàm chờ (giây)
+POLL_INTERVAL = 0.1
+
+# File lưu đường dẫn chromedriver đã tải để lần sau không phải gọi mạng (cạnh module, không phụ thuộc thư mục chạy)
+DRIVER_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chromedriver_path")
+
+# Cờ Chrome giảm tài nguyên: không tải ảnh, không extension, giới hạn cache
+LIGHTWEIGHT_CHROME_ARGS = [
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+    "--disk-cache-size=33554432",
+    "--window-size=1920,1080",
+]
+
+def resolve_driver_path(cache_file=DRIVER_CACHE_FILE, refresh=False):
+    """Lấy đường dẫn chromedriver: biến môi trường CHROMEDRIVER_PATH, file cache, hoặc tải bằng webdriver_manager"""
+    if refresh:
+        # chromedriver đã lưu không còn khớp phiên bản Chrome: bỏ cache, để webdriver_manager kiểm tra phiên bản
+        try:
+            os.remove(cache_file)
+        except FileNotFoundError:
+            pass
+    else:
+        path = os.environ.get("CHROMEDRIVER_PATH")
+        if path and os.path.exists(path):
+            return path
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as file:
+                path = file.read().strip()
+            if path and os.path.exists(path):
+                return path
+        except FileNotFoundError:
+            pass
+    path = ChromeDriverManager().install()
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as file:
+            file.write(path)
+    except OSError as e:
+        logger.warning(f"Không lưu được đường dẫn chromedriver vào {cache_file}: {e}")
+    return path
 
 class SeleniumHelper:
-    def __init__(self, browser="chrome"):
+    def __init__(self, browser="chrome", headless=False, lightweight=None):
+        # lightweight mặc định bật khi chạy headless
+        if lightweight is None:
+            lightweight = headless
+        self.tab_pool = None
         if browser.lower() == "chrome":
-            self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+            options = webdriver.ChromeOptions()
+            if headless:
+                options.add_argument("--headless=new")
+            if lightweight:
+                for argument in LIGHTWEIGHT_CHROME_ARGS:
+                    options.add_argument(argument)
+                options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+            try:
+                self.driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=options)
+            except SessionNotCreatedException as e:
+                # Thường do Chrome tự cập nhật sau khi đã cache đường dẫn chromedriver, tải lại driver và thử một lần
+                logger.warning(f"Không tạo được phiên Chrome với chromedriver đã lưu, tải lại driver: {e}")
+                self.driver = webdriver.Chrome(service=Service(resolve_driver_path(refresh=True)), options=options)
         else:
             raise ValueError("Unsupported browser!")
 
@@ -18,8 +88,11 @@ class SeleniumHelper:
     def find_element(self, by, value):
         return self.driver.find_element(by, value)
 
+    def find_elements(self, by, value):
+        return self.driver.find_elements(by, value)
+
     def click_element(self, by, value):
-        element = self.wait_for_element_to_appear(by, value)
+        element = self.wait_for_element_clickable(by, value)
         if element:
             element.click()
 
@@ -29,19 +102,148 @@ class SeleniumHelper:
             element.clear()
             element.send_keys(text)
 
-    def wait_for_element_to_appear(self, by, value, timeout=120):
+    def wait_until(self, condition, timeout=10, poll=POLL_INTERVAL):
+        """Chờ đến khi condition(driver) trả về giá trị truthy, trả về giá trị đó hoặc None khi hết giờ"""
         try:
-            return WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((by, value))
-            )
-        except:
+            return WebDriverWait(self.driver, timeout, poll_frequency=poll).until(condition)
+        except TimeoutException:
             return None
 
+    def wait_for_element_to_appear(self, by, value, timeout=120, poll=POLL_INTERVAL):
+        return self.wait_until(EC.presence_of_element_located((by, value)), timeout, poll)
+
+    def wait_for_element_clickable(self, by, value, timeout=120, poll=POLL_INTERVAL):
+        return self.wait_until(EC.element_to_be_clickable((by, value)), timeout, poll)
+
+    def wait_for_page_ready(self, timeout=30, poll=POLL_INTERVAL):
+        return self.wait_until(
+            lambda driver: driver.execute_script("return document.readyState;") == "complete",
+            timeout, poll)
+
+    def wait_for_network_idle(self, idle_time=0.5, timeout=30, poll=POLL_INTERVAL):
+        """Chờ trang tải xong và không có request mới (số resource entry không đổi) trong idle_time giây"""
+        if not self.wait_for_page_ready(timeout, poll):
+            return False
+        state = {"count": -1, "since": time.monotonic()}
+
+        def idle(driver):
+            count = driver.execute_script("return performance.getEntriesByType('resource').length;")
+            now = time.monotonic()
+            if count != state["count"]:
+                state["count"] = count
+                state["since"] = now
+                return False
+            return now - state["since"] >= idle_time
+
+        return bool(self.wait_until(idle, timeout, poll))
+
+    def count_children(self, element):
+        return self.execute_javascript("return arguments[0].querySelectorAll('*').length;", element)
+
+    def wait_for_row_count_change(self, element, previous_count, timeout=5, poll=POLL_INTERVAL):
+        """Chờ số phần tử con của element (các dòng đang render) khác previous_count, trả về số mới hoặc None"""
+        def changed(driver):
+            count = self.count_children(element)
+            return count if count != previous_count else False
+
+        return self.wait_until(changed, timeout, poll)
+
+    def wait_for_scroll_settle(self, element, settle_time=0.3, timeout=5, poll=POLL_INTERVAL):
+        """Chờ scrollTop và số dòng của element ổn định trong settle_time giây, trả về scrollTop cuối cùng"""
+        state = {"value": None, "since": time.monotonic()}
+
+        def settled(driver):
+            value = driver.execute_script(
+                "return [arguments[0].scrollTop, arguments[0].querySelectorAll('*').length];", element)
+            now = time.monotonic()
+            if value != state["value"]:
+                state["value"] = value
+                state["since"] = now
+                return False
+            return now - state["since"] >= settle_time
+
+        self.wait_until(settled, timeout, poll)
+        return state["value"][0] if state["value"] else None
+
+    def get_visible_items(self, list_xpath, item_xpath):
+        """Đọc tên mọi item đang render trong danh sách ảo cùng thông số cuộn bằng một lần execute_script"""
+        # item_xpath tương đối với phần tử list, trả về None nếu không tìm thấy list
+        return self.execute_javascript("""
+            var list = document.evaluate(arguments[0], document, null,
+                XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+            if (!list) { return null; }
+            var nodes = document.evaluate(arguments[1], list, null,
+                XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            var items = [];
+            for (var i = 0; i < nodes.snapshotLength; i++) {
+                items.push(nodes.snapshotItem(i).textContent.trim());
+            }
+            return {items: items, scrollTop: list.scrollTop,
+                    scrollHeight: list.scrollHeight, clientHeight: list.clientHeight};
+        """, list_xpath, item_xpath)
+
+    def refresh(self, timeout=30):
+        self.driver.refresh()
+        return self.wait_for_network_idle(timeout=timeout)
+
     def execute_javascript(self, script, *args):
         return self.driver.execute_script(script, *args)
 
     def switch_to_new_window(self):
         self.driver.switch_to.window(self.driver.window_handles[-1])
 
+    def is_alive(self):
+        """Kiểm tra phiên WebDriver còn hoạt động (chromedriver và trình duyệt chưa chết)"""
+        try:
+            self.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
     def close_browser(self):
-        self.driver.quit()
\ No newline at end of file
+        self.driver.quit()
+
+
+class TabPool:
+    """Giữ sẵn các tab đã mở trang RedisInsight để tái sử dụng giữa các topic thay vì mở/đóng tab mới"""
+
+    def __init__(self, selenium, url, size=1):
+        self.selenium = selenium
+        self.url = url
+        self.home = selenium.driver.current_window_handle
+        self.idle = []
+        for _ in range(size):
+            self.idle.append(self._open_tab())
+        selenium.driver.switch_to.window(self.home)
+
+    def _open_tab(self):
+        driver = self.selenium.driver
+        driver.switch_to.new_window("tab")
+        self.selenium.open_url(self.url)
+        return driver.current_window_handle
+
+    def acquire(self):
+        """Chuyển sang một tab đã tải sẵn trang (mở thêm nếu hết) và trả về handle của tab"""
+        handle = self.idle.pop() if self.idle else self._open_tab()
+        self.selenium.driver.switch_to.window(handle)
+        self.selenium.wait_for_page_ready()
+        return handle
+
+    def release(self, handle):
+        """Trả tab về pool (tab nên đã được reload bởi người dùng) và quay lại tab chính"""
+        driver = self.selenium.driver
+        try:
+            driver.switch_to.window(self.home)
+            self.idle.append(handle)
+        except WebDriverException as e:
+            logger.warning(f"Không trả được tab về pool: {e}")
+
+    def discard(self, handle):
+        """Đóng tab bị lỗi, lần acquire sau sẽ mở tab mới"""
+        driver = self.selenium.driver
+        try:
+            driver.switch_to.window(handle)
+            driver.close()
+        except WebDriverException as e:
+            logger.warning(f"Không đóng được tab lỗi: {e}")
+        driver.switch_to.window(self.home)
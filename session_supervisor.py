@@ -0,0 +1,38 @@
+import time
+
+from logging_setup import get_logger
+from metrics import metrics
+
+logger = get_logger("deletion")
+
+
+class SessionSupervisor:
+    """Chạy lại tác vụ khi phiên WebDriver hoặc kết nối Redis bị mất; tác vụ tự tiếp tục từ checkpoint"""
+
+    def __init__(self, max_restarts=5, backoff=5.0, max_backoff=120.0, healthy_after=300.0):
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Tác vụ chạy ổn định lâu hơn healthy_after giây thì đếm lại số lần khởi động lại từ đầu
+        self.healthy_after = healthy_after
+        self.restarts = 0
+
+    def run(self, task):
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                return task()
+            except Exception as e:
+                if time.monotonic() - started >= self.healthy_after:
+                    failures = 0
+                if failures >= self.max_restarts:
+                    logger.error(f"Phiên làm việc lỗi sau {failures} lần khởi động lại, dừng hẳn: {e}")
+                    raise
+                failures += 1
+                self.restarts += 1
+                metrics.inc("restarts")
+                delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+                logger.warning(f"Phiên làm việc bị lỗi: {e}. Khởi động lại sau {delay:.0f}s "
+                                f"(lần {failures}/{self.max_restarts})")
+                time.sleep(delay)
@@ -0,0 +1,65 @@
+import json
+
+from checkpoint_journal import CheckpointJournal
+
+
+def read_events(path):
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def test_replay_restores_state(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    journal = CheckpointJournal(path)
+    journal.record_queued("a")
+    journal.record_processed("a")
+    journal.record_deleted("a")
+    journal.record_key_count(10)
+    journal.record_key_count(5)
+    journal.record_queued("b")
+    journal.record_cursor("redis_scan", 42)
+    journal.record_fingerprint("a", 0)
+    journal.close()
+
+    journal = CheckpointJournal(path)
+    assert journal.processed == {"a"}
+    assert journal.deleted == {"a"}
+    assert journal.total_keys_deleted == 15
+    assert journal.pending_topics() == ["b"]
+    assert journal.cursors == {"redis_scan": 42}
+    assert journal.fingerprints["a"]["keys"] == 0
+    journal.close()
+
+
+def test_compact_keeps_state_and_drops_history(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    journal = CheckpointJournal(path)
+    for number in range(20):
+        journal.record_key_count(1)
+        journal.record_cursor("redis_scan", number)
+    journal.record_processed("Du lịch")
+    journal.record_cursor("ui_list", None)
+    journal.compact()
+    journal.record_deleted("b")
+    journal.close()
+
+    events = read_events(path)
+    assert {"e": "keys", "n": 20} in events
+    assert [event for event in events if event["e"] == "cursor"] == [{"e": "cursor", "name": "redis_scan", "value": 19}]
+
+    journal = CheckpointJournal(path)
+    assert journal.processed == {"Du lịch"}
+    assert journal.deleted == {"b"}
+    assert journal.total_keys_deleted == 20
+    journal.close()
+
+
+def test_torn_tail_does_not_swallow_next_event(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text('{"e": "processed", "topic": "a"}\n{"e": "proc', encoding='utf-8')
+
+    journal = CheckpointJournal(str(path))
+    journal.record_processed("b")
+    journal.close()
+
+    assert CheckpointJournal(str(path)).processed == {"a", "b"}
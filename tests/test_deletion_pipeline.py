@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from deletion_pipeline import DeletionPipeline
+from redis_helper import RedisHelper
+
+
+class PagedRedisHelper(RedisHelper):
+    """fakeredis bỏ qua COUNT của SCAN, chia trang cố định để kiểm tra cursor"""
+
+    def __init__(self, client, page_size):
+        super().__init__(client=client)
+        self.page_size = page_size
+        self.keys = sorted(client.keys())
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def scan_page(self, cursor=0, pattern="*", count=1000):
+        page = self.keys[cursor:cursor + self.page_size]
+        next_cursor = cursor + self.page_size
+        return (next_cursor if next_cursor < len(self.keys) else 0), page
+
+    def unlink_keys(self, keys, chunk_size=100):
+        # Lô đầu chậm nhất để các lô sau xong trước, commit vẫn phải theo đúng thứ tự
+        with self._lock:
+            self.calls += 1
+            first = self.calls == 1
+        time.sleep(0.05 if first else 0)
+        return super().unlink_keys(keys, chunk_size)
+
+
+def seed(client, keys):
+    for index in range(keys):
+        client.set(f"offline_recommend/{index:04d}/{'keep' if index % 4 == 0 else f't{index % 3}'}", 1)
+    client.set("documents:collaborative_recommend:1", 1)
+
+
+def test_pipeline_commits_in_order_with_several_workers(redis_client):
+    seed(redis_client, 400)
+    helper = PagedRedisHelper(redis_client, page_size=37)
+    commits = []
+    lock = threading.Lock()
+
+    def on_commit(cursor, keys_deleted, new_topics):
+        with lock:
+            commits.append((cursor, keys_deleted, remaining_after(cursor)))
+
+    def remaining_after(cursor):
+        # Mọi key thuộc các trang trước cursor phải đã bị xóa khi cursor được commit
+        if cursor is None:
+            return 0
+        scanned = helper.keys if cursor == 0 else helper.keys[:cursor]
+        return sum(1 for key in scanned if redis_client.exists(key) and not key.endswith("/keep") and "/" in key)
+
+    pipeline = DeletionPipeline(helper, lambda topic: topic != "keep", workers=4, batch_size=10,
+                                on_commit=on_commit)
+    assert pipeline.run() == 300
+
+    cursors = [cursor for cursor, _, _ in commits if cursor is not None]
+    assert cursors == sorted(cursors[:-1]) + [0]
+    assert all(remaining == 0 for _, _, remaining in commits)
+    assert sum(deleted for _, deleted, _ in commits) == 300
+    assert sorted(pipeline.topic_keys.items()) == [("t0", 100), ("t1", 100), ("t2", 100)]
+    assert redis_client.dbsize() == 101
+
+
+def test_pipeline_resumes_from_cursor(redis_client):
+    seed(redis_client, 100)
+    helper = PagedRedisHelper(redis_client, page_size=20)
+    pipeline = DeletionPipeline(helper, lambda topic: topic != "keep", workers=2, batch_size=7)
+
+    pipeline.run(cursor=60)
+
+    remaining = sorted(redis_client.keys("offline_recommend/*"))
+    assert all(key in remaining for key in helper.keys[:60] if "/" in key)
+    assert not [key for key in helper.keys[60:] if key in remaining and not key.endswith("/keep")]
+
+
+class FailingRedisHelper(PagedRedisHelper):
+    """UNLINK của lô thứ fail_call bị lỗi"""
+
+    def __init__(self, client, page_size, fail_call):
+        super().__init__(client, page_size)
+        self.fail_call = fail_call
+
+    def unlink_keys(self, keys, chunk_size=100):
+        with self._lock:
+            self.calls += 1
+            failing = self.calls == self.fail_call
+        if failing:
+            raise ConnectionError("mất kết nối")
+        return RedisHelper.unlink_keys(self, keys, chunk_size)
+
+
+def test_pipeline_stops_checkpointing_at_failed_batch(redis_client):
+    seed(redis_client, 40)
+    helper = FailingRedisHelper(redis_client, page_size=10, fail_call=2)
+    cursors = []
+
+    def on_commit(cursor, keys_deleted, new_topics):
+        if cursor is not None:
+            cursors.append(cursor)
+
+    pipeline = DeletionPipeline(helper, lambda topic: topic != "keep", workers=1, batch_size=5,
+                                on_commit=on_commit)
+    with pytest.raises(RuntimeError):
+        pipeline.run()
+
+    # Lô thứ hai (nửa sau trang đầu) lỗi nên cursor của trang đầu không bao giờ được lưu
+    assert cursors == []
+    assert any(redis_client.exists(key) for key in helper.keys[:10] if not key.endswith("/keep"))
+
+    # Chạy lại từ cursor đã lưu (ở đây là 0) xóa nốt phần còn lại
+    helper = PagedRedisHelper(redis_client, page_size=10)
+    DeletionPipeline(helper, lambda topic: topic != "keep", workers=1, batch_size=5).run()
+    assert sorted(redis_client.keys("offline_recommend/*")) == [key for key in helper.keys if key.endswith("/keep")]
@@ -0,0 +1,31 @@
+from deletion_throttle import DeletionThrottle
+
+
+def test_adjust_halves_on_high_latency_and_recovers_additively():
+    latencies = iter([0.010, 0.010, 0.010, 0.010, 0.001, 0.001, 0.004])
+    throttle = DeletionThrottle(max_keys_per_sec=1000, target_latency_ms=5.0, probe=lambda: next(latencies),
+                                sample_interval=0, min_keys_per_sec=200)
+
+    rates = []
+    for _ in range(7):
+        throttle._maybe_sample()
+        rates.append(throttle.rate)
+
+    # Giảm một nửa, không xuống dưới min; tăng 10% trần mỗi lần khi độ trễ < nửa mục tiêu; giữ nguyên ở giữa
+    assert rates == [500, 250, 200, 200, 300, 400, 400]
+
+
+def test_adjust_never_exceeds_max_rate():
+    throttle = DeletionThrottle(max_keys_per_sec=1000, target_latency_ms=5.0, probe=lambda: 0.0, sample_interval=0)
+    for _ in range(5):
+        throttle._maybe_sample()
+    assert throttle.rate == 1000
+
+
+def test_probe_error_keeps_rate():
+    def probe():
+        raise ConnectionError("mất kết nối")
+
+    throttle = DeletionThrottle(max_keys_per_sec=1000, probe=probe, sample_interval=0)
+    throttle._maybe_sample()
+    assert throttle.rate == 1000
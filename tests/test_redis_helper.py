@@ -0,0 +1,95 @@
+import pytest
+
+from redis_helper import PartialDeleteError, RedisHelper, escape_pattern, topic_pattern
+
+
+def test_delete_keys_by_pattern_counts_deleted_keys(redis_client):
+    for index in range(1234):
+        redis_client.set(f"offline_recommend/{index}/Du lịch", 1)
+        redis_client.set(f"offline_recommend/{index}/Ẩm thực", 1)
+    helper = RedisHelper(client=redis_client)
+    helper.batch_size = 100
+
+    assert helper.delete_keys_by_pattern(topic_pattern("Du lịch")) == 1234
+    assert redis_client.dbsize() == 1234
+    assert helper.delete_keys_by_pattern(topic_pattern("Du lịch")) == 0
+
+
+def test_topic_pattern_escapes_glob_characters(redis_client):
+    redis_client.set("offline_recommend/1/a*b", 1)
+    redis_client.set("offline_recommend/2/axxb", 1)
+    redis_client.set("offline_recommend/3/a?[c]", 1)
+    redis_client.set("offline_recommend/4/azc", 1)
+    helper = RedisHelper(client=redis_client)
+
+    assert helper.delete_keys_by_pattern(topic_pattern("a*b")) == 1
+    assert helper.delete_keys_by_pattern(topic_pattern("a?[c]")) == 1
+    assert sorted(redis_client.keys()) == ["offline_recommend/2/axxb", "offline_recommend/4/azc"]
+
+
+def test_escape_pattern():
+    assert escape_pattern("a*b?c[d]\\e") == "a\\*b\\?c\\[d\\]\\\\e"
+
+
+def seed_topics(client, keys, *topics):
+    for index in range(keys):
+        for topic in topics:
+            client.set(f"offline_recommend/{index}/{topic}", 1)
+
+
+def test_delete_by_script_deletes_across_calls(redis_client):
+    pytest.importorskip("lupa")
+    seed_topics(redis_client, 3000, "A", "keep")
+    helper = RedisHelper(client=redis_client, use_lua=True)
+    helper.batch_size = 7
+
+    # scan_count nhỏ và max_pages=1 để script phải gọi lại nhiều lần mới quét hết
+    assert helper.delete_by_script(topic_pattern("A"), scan_count=100, max_pages=1) == (3000, {})
+    assert redis_client.dbsize() == 3000
+    assert helper.delete_keys_by_pattern(topic_pattern("A")) == 0
+
+
+def test_delete_topics_counts_per_topic(redis_client):
+    pytest.importorskip("lupa")
+    seed_topics(redis_client, 3000, "B", "C", "keep")
+    redis_client.set("documents:collaborative_recommend:1", 1)
+    helper = RedisHelper(client=redis_client, use_lua=True)
+
+    assert helper.delete_topics(["B", "C", "missing"], scan_count=500, max_pages=2) == {"B": 3000, "C": 3000}
+    assert sorted(redis_client.keys("*/B")) == []
+    assert redis_client.dbsize() == 3001
+
+
+def test_delete_by_script_reports_partial_deletes(redis_client):
+    pytest.importorskip("lupa")
+    seed_topics(redis_client, 1000, "D", "E")
+    helper = RedisHelper(client=redis_client, use_lua=True)
+    helper.delete_by_script("*/none", max_pages=1)  # nạp script trước khi thay bằng bản lỗi ở lần gọi thứ hai
+    script = helper._delete_script
+    calls = []
+
+    def failing_script(args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise ConnectionError("mất kết nối")
+        return script(args=args)
+
+    helper._delete_script = failing_script
+    with pytest.raises(PartialDeleteError) as error:
+        helper.delete_topics(["D", "E"], scan_count=100, max_pages=1)
+
+    deleted = 2000 - redis_client.dbsize()
+    assert 0 < deleted < 2000
+    assert error.value.deleted == deleted
+    assert sum(error.value.topic_keys.values()) == deleted
+
+
+def test_delete_by_script_raises_original_error_before_any_delete(redis_client):
+    helper = RedisHelper(client=redis_client, use_lua=True)
+
+    def failing_script(args):
+        raise ConnectionError("mất kết nối")
+
+    helper._delete_script = failing_script
+    with pytest.raises(ConnectionError):
+        helper.delete_topics(["D"])
@@ -0,0 +1,60 @@
+import unicodedata
+
+from topic_allowlist import TopicAllowlist, flatten_entries, scope_flags
+
+
+def test_flatten_nested_entries():
+    entries = ["a", ["b", ("c", ["d"])], 5, None, "e"]
+    assert list(flatten_entries(entries)) == ["a", "b", "c", "d", "e"]
+    assert list(flatten_entries("a")) == ["a"]
+
+
+def test_exact_lookup_is_unicode_normalized():
+    nfd = unicodedata.normalize("NFD", "Du lịch")
+    allowlist = TopicAllowlist([nfd, " Ẩm thực ", "Ẩm thực"])
+
+    assert "Du lịch" in allowlist
+    assert nfd in allowlist
+    assert unicodedata.normalize("NFD", "Ẩm thực") in allowlist
+    assert "Du lich" not in allowlist
+    assert allowlist.duplicates == 1
+
+
+def test_prefix_glob_folds_into_prefixes():
+    allowlist = TopicAllowlist(["glob:tin_tuc_*", "prefix:the_thao", "glob:*_2024", "glob:a?c*"])
+
+    assert allowlist.prefix_count == 2
+    assert len(allowlist.patterns) == 2
+    assert "tin_tuc_moi" in allowlist
+    assert "the_thao_vn" in allowlist
+    assert "bau_cu_2024" in allowlist
+    assert "abcd" in allowlist
+    assert "tin_tuc" not in allowlist
+    assert "bau_cu_2025" not in allowlist
+
+
+def test_regex_rules_and_errors():
+    allowlist = TopicAllowlist(["re:(?i)news_\\d+", "re:sport_[a-z]+", "re:broken(", "re:(?i"])
+
+    assert "NEWS_12" in allowlist
+    assert "sport_vn" in allowlist
+    assert "SPORT_VN" not in allowlist
+    assert "news_x" not in allowlist
+    assert len(allowlist.errors) == 2
+    assert all("Regex không hợp lệ" in error for error in allowlist.errors)
+
+
+def test_scope_flags():
+    assert scope_flags("(?i)abc") == "(?i:abc)"
+    assert scope_flags("abc(?i:d)") == "abc(?i:d)"
+
+
+def test_to_rules_round_trips():
+    allowlist = TopicAllowlist(["b", "a", ["a"], "glob:x*", "prefix:y", "re:z\\d", "glob:*.log"])
+    rules = allowlist.to_rules()
+
+    assert rules[:4] == ["a", "b", "prefix:x", "prefix:y"]
+    rebuilt = TopicAllowlist(rules)
+    assert rebuilt.to_rules() == rules
+    for topic in ["a", "b", "xa", "yb", "z1", "app.log", "c", "z", "app.txt"]:
+        assert (topic in rebuilt) == (topic in allowlist)
@@ -0,0 +1,168 @@
+import argparse
+import fnmatch
+import json
+import re
+import sys
+import unicodedata
+
+from logging_setup import get_logger
+
+logger = get_logger("state")
+
+# Tiền tố cho các luật không phải so khớp chính xác
+REGEX_PREFIX = "re:"
+GLOB_PREFIX = "glob:"
+PREFIX_PREFIX = "prefix:"
+
+_GLOB_SPECIAL = re.compile(r'[*?\[]')
+# Cờ toàn cục ở đầu regex, ví dụ '(?i)abc'
+_GLOBAL_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+
+def scope_flags(pattern):
+    """Đổi cờ toàn cục '(?i)abc' thành cờ cục bộ '(?i:abc)' để ghép được nhiều regex thành một"""
+    match = _GLOBAL_FLAGS.match(pattern)
+    if match is None:
+        return pattern
+    return f"(?{match.group(1)}:{pattern[match.end():]})"
+
+
+def normalize_topic(topic):
+    """Chuẩn hóa Unicode NFC (tiếng Việt có thể ở dạng tổ hợp NFD) và bỏ khoảng trắng thừa"""
+    return unicodedata.normalize("NFC", topic).strip()
+
+
+def flatten_entries(entries):
+    """Làm phẳng danh sách lồng nhau, trả về các entry dạng chuỗi"""
+    if isinstance(entries, str):
+        yield entries
+        return
+    for entry in entries:
+        if isinstance(entry, (list, tuple)):
+            yield from flatten_entries(entry)
+        elif isinstance(entry, str):
+            yield entry
+        else:
+            logger.warning(f"Bỏ qua entry không phải chuỗi trong danh sách topic: {entry!r}")
+
+
+class TopicAllowlist:
+    """Danh sách topic được giữ lại: so khớp chính xác, theo tiền tố, glob và regex"""
+
+    def __init__(self, entries=()):
+        exact = set()
+        prefixes = set()
+        patterns = []
+        self.errors = []
+        self.duplicates = 0
+
+        for raw in flatten_entries(entries):
+            # Chỉ bỏ khoảng trắng ở topic chính xác, thân của luật tiền tố/pattern giữ nguyên
+            entry = unicodedata.normalize("NFC", raw).lstrip()
+            if not entry.strip():
+                continue
+            if entry.startswith(REGEX_PREFIX):
+                pattern = entry[len(REGEX_PREFIX):]
+                try:
+                    re.compile(pattern)
+                    re.compile(scope_flags(pattern))
+                except re.error as e:
+                    self.errors.append(f"Regex không hợp lệ '{pattern}': {e}")
+                    continue
+                patterns.append(pattern)
+            elif entry.startswith(GLOB_PREFIX):
+                pattern = entry[len(GLOB_PREFIX):]
+                # Glob dạng 'abc*' chỉ là tiền tố, không cần qua regex
+                if pattern.endswith("*") and not _GLOB_SPECIAL.search(pattern[:-1]):
+                    prefixes.add(pattern[:-1])
+                else:
+                    patterns.append(fnmatch.translate(pattern))
+            elif entry.startswith(PREFIX_PREFIX):
+                prefixes.add(entry[len(PREFIX_PREFIX):])
+            elif entry.strip() in exact:
+                self.duplicates += 1
+            else:
+                exact.add(entry.strip())
+
+        self.exact = frozenset(exact)
+        # Gom tiền tố theo độ dài: mỗi lần tra chỉ cần một phép lấy lát cắt + tra set cho mỗi độ dài
+        by_length = {}
+        for prefix in prefixes:
+            by_length.setdefault(len(prefix), set()).add(prefix)
+        self.prefixes = {length: frozenset(items) for length, items in sorted(by_length.items())}
+        self.prefix_count = len(prefixes)
+        self.patterns = patterns
+        self._matcher = None
+        self._matchers = []
+        if patterns:
+            try:
+                self._matcher = re.compile("|".join(f"(?:{scope_flags(p)})" for p in patterns))
+            except re.error as e:
+                # Từng luật đã hợp lệ nhưng phép ghép vẫn có thể lỗi, khi đó so khớp từng regex riêng
+                self.errors.append(f"Không ghép được các luật regex/glob: {e}")
+                self._matchers = [re.compile(scope_flags(p)) for p in patterns]
+
+    def __contains__(self, topic):
+        return self.matches(topic)
+
+    def __len__(self):
+        return len(self.exact) + self.prefix_count + len(self.patterns)
+
+    def matches(self, topic):
+        topic = normalize_topic(topic)
+        if topic in self.exact:
+            return True
+        for length, items in self.prefixes.items():
+            if length > len(topic):
+                break
+            if topic[:length] in items:
+                return True
+        if self._matcher is not None:
+            return self._matcher.fullmatch(topic) is not None
+        return any(matcher.fullmatch(topic) is not None for matcher in self._matchers)
+
+    def to_rules(self):
+        """Danh sách luật đã chuẩn hóa, khử trùng lặp và sắp xếp"""
+        rules = sorted(self.exact)
+        rules += sorted(PREFIX_PREFIX + p for items in self.prefixes.values() for p in items)
+        rules += [REGEX_PREFIX + p for p in self.patterns]
+        return rules
+
+    @classmethod
+    def from_file(cls, file_path="topic.json"):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm tra và biên dịch danh sách topic giữ lại (topic.json)")
+    parser.add_argument("command", choices=["validate", "compile"],
+                        help="validate: kiểm tra file; compile: ghi danh sách luật đã chuẩn hóa")
+    parser.add_argument("file", nargs="?", default="topic.json")
+    parser.add_argument("-o", "--output", default=None, help="File kết quả cho lệnh compile (mặc định in ra stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        allowlist = TopicAllowlist.from_file(args.file)
+    except Exception as e:
+        print(f"Lỗi khi đọc file {args.file}: {e}", file=sys.stderr)
+        return 1
+
+    for error in allowlist.errors:
+        print(error, file=sys.stderr)
+
+    if args.command == "validate":
+        print(f"{args.file}: {len(allowlist.exact)} topic chính xác, {allowlist.prefix_count} tiền tố, "
+              f"{len(allowlist.patterns)} pattern, {allowlist.duplicates} trùng lặp, {len(allowlist.errors)} lỗi")
+    else:
+        output = json.dumps(allowlist.to_rules(), ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                file.write(output + "\n")
+        else:
+            print(output)
+    return 1 if allowlist.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import sys
+
+
+def parse_topic(key):
+    """Lấy topic là phần cuối của key dạng prefix/.../topic"""
+    return key.split('/')[-1] if '/' in key else key
+
+
+class TopicDiscovery:
+    """Quét toàn bộ keyspace một lần bằng SCAN và gom key theo topic"""
+
+    def __init__(self, redis_helper, match="*", scan_count=1000, sample_size=0):
+        self.redis_helper = redis_helper
+        self.match = match
+        self.scan_count = scan_count
+        self.sample_size = sample_size
+        self.counts = {}
+        self.samples = {}
+        self.total_keys = 0
+
+    def scan(self, cursor=0, on_page=None):
+        """Trả về từng topic ngay khi gặp lần đầu, số key theo topic được cộng dồn vào self.counts"""
+        # on_page(cursor) được gọi khi bên gọi đã xử lý hết topic của một trang SCAN, dùng để lưu checkpoint
+        counts = self.counts
+        while True:
+            cursor, keys = self.redis_helper.scan_page(cursor, self.match, count=self.scan_count)
+            for key in keys:
+                self.total_keys += 1
+                if '/' not in key:
+                    # Key không có dạng prefix/.../topic không bao giờ khớp '*/{topic}', không coi là topic
+                    continue
+                topic = parse_topic(key)
+                if topic in counts:
+                    counts[topic] += 1
+                    if counts[topic] <= self.sample_size:
+                        self.samples[topic].append(key)
+                else:
+                    # Intern để mỗi topic chỉ có một chuỗi dùng chung cho counts và samples
+                    topic = sys.intern(topic)
+                    counts[topic] = 1
+                    if self.sample_size:
+                        self.samples[topic] = [key]
+                    yield topic
+            if on_page is not None:
+                on_page(cursor)
+            if cursor == 0:
+                break